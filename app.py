@@ -1,15 +1,15 @@
 import streamlit as st
 import os
 import tempfile
-import fitz  # PyMuPDF
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema.document import Document
 from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
 from langchain.chains import RetrievalQA
 from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from utils.env_loader import load_env_vars
+from utils.document_processor import extract_page_texts, get_embeddings
+from utils.llm_cache import make_key
 from utils.section_navigator import SectionNavigator
 from utils.audio_processor import AudioProcessor
 from utils.legal_comparison import LegalComparison
@@ -68,24 +68,18 @@ An intelligent legal assistant that helps users navigate Omani laws through natu
 def process_law_pdf(file_path):
     """Process a legal PDF document and return langchain Document objects."""
     try:
-        doc = fitz.open(file_path)
-        text = ""
+        page_texts = extract_page_texts(file_path)
         
-        # Extract text and maintain structure
-        for page_num, page in enumerate(doc):
-            text += page.get_text()
-            text += "\n\n"  # Add extra newlines between pages
+        # Join pages in one pass, with extra newlines between pages
+        text = "".join(f"{page_text}\n\n" for page_text in page_texts)
         
         # Get document metadata
         metadata = {
             "source": os.path.basename(file_path),
             "title": os.path.basename(file_path).replace(".pdf", ""),
-            "page_count": len(doc)
+            "page_count": len(page_texts)
         }
         
-        # Close the document
-        doc.close()
-        
         # Split text into chunks
         splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
@@ -107,40 +101,54 @@ def process_law_pdf(file_path):
         st.error(f"Error processing PDF: {str(e)}")
         return []
 
+# Chunks are embedded and added to Chroma in batches of this size (Chroma caps the size of a single add)
+VECTOR_DB_BATCH_SIZE = 1000
+
+def _chunk_id(doc):
+    """Stable ID for a document chunk; it hashes the chunk text, so an edited PDF yields new IDs."""
+    return make_key(doc.metadata.get('source', ''), str(doc.metadata.get('chunk', '')), doc.page_content)
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def _open_vector_db(persist_directory):
+    """Open the persistent Chroma store once per directory and reuse the handle across reruns."""
+    # Use HuggingFace embeddings for compatibility
+    try:
+        # Shared small, fast model (loaded once per process)
+        embeddings = get_embeddings()
+        
+        st.success("Using HuggingFace embeddings for vector database.")
+    except Exception as e:
+        # Raised rather than returned, so a transient failure is not cached
+        raise Exception(f"Error setting up HuggingFace embeddings: {str(e)}")
+    
+    # Chroma persists automatically when persist_directory is set
+    return Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+
 def setup_vector_db(documents, persist_directory="./omani_laws"):
-    """Set up a vector database from document chunks."""
+    """
+    Set up a vector database from document chunks.
+    Only chunks not already stored are embedded; stored chunks of these sources that no longer exist are removed.
+    """
     try:
         # Ensure the directory exists
         os.makedirs(persist_directory, exist_ok=True)
         
-        # Use HuggingFace embeddings for compatibility
-        try:
-            # Import HuggingFace embeddings
-            from langchain_community.embeddings import HuggingFaceEmbeddings
-            
-            # Initialize with a small, fast model
-            model_kwargs = {'device': 'cpu'}
-            encode_kwargs = {'normalize_embeddings': True}
-            embeddings = HuggingFaceEmbeddings(
-                model_name="all-MiniLM-L6-v2",
-                model_kwargs=model_kwargs,
-                encode_kwargs=encode_kwargs
-            )
-            
-            st.success("Using HuggingFace embeddings for vector database.")
-        except Exception as e:
-            st.error(f"Error setting up HuggingFace embeddings: {str(e)}")
-            return None
+        vector_db = _open_vector_db(persist_directory)
         
-        # Create vector store
-        vector_db = Chroma.from_documents(
-            documents=documents,
-            embedding=embeddings,
-            persist_directory=persist_directory
-        )
+        ids = [_chunk_id(doc) for doc in documents]
+        sources = sorted({doc.metadata.get('source', '') for doc in documents})
+        stored_ids = set(vector_db.get(where={"source": {"$in": sources}}, include=[])["ids"])
+        
+        # Drop chunks from earlier versions of these documents
+        stale_ids = stored_ids.difference(ids)
+        if stale_ids:
+            vector_db.delete(ids=list(stale_ids))
         
-        # Persist to disk
-        vector_db.persist()
+        # Add the new chunks incrementally to the cached handle
+        new_chunks = [(doc_id, doc) for doc_id, doc in zip(ids, documents) if doc_id not in stored_ids]
+        for start in range(0, len(new_chunks), VECTOR_DB_BATCH_SIZE):
+            batch = new_chunks[start:start + VECTOR_DB_BATCH_SIZE]
+            vector_db.add_documents([doc for _, doc in batch], ids=[doc_id for doc_id, _ in batch])
         
         return vector_db
     
@@ -232,15 +240,17 @@ def load_legal_documents():
             # Process files, loading at least 20 documents or all priority files
             max_docs = 30  # Increased from 5 to 30 for better coverage
             all_documents = []
+            loaded_files = []
             
             for pdf_file in sorted_pdf_files[:max_docs]:  # Load more documents
                 documents = process_law_pdf(pdf_file)
                 if documents:
                     all_documents.extend(documents)
                     st.session_state.documents.append(os.path.basename(pdf_file))
-                    
-                    # Load document into section navigator as well
-                    st.session_state.section_navigator.load_document(pdf_file)
+                    loaded_files.append(pdf_file)
+            
+            # Load the documents into the section navigator as well, parsed in parallel
+            st.session_state.section_navigator.load_documents(loaded_files)
             
             if all_documents:
                 # Initialize vector database
@@ -0,0 +1,48 @@
+"""
+Tests for the keyword provision search in utils.legal_comparison.
+"""
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_openai")
+
+from utils import legal_comparison
+from utils.legal_comparison import LegalComparison
+
+# Article 1 starts on page 1 and its text runs on to page 2, ahead of Article 2
+PAGES = (
+    "Article 1 Inheritance shares are fixed by law.\n",
+    "Further inheritance rules apply to spouses.\n\nArticle 2 Contracts must be in writing.\n",
+)
+
+@pytest.fixture
+def comparison(tmp_path, monkeypatch):
+    document = tmp_path / "law.pdf"
+    document.write_bytes(b"")
+    monkeypatch.setattr(legal_comparison, "PAGE_INDEX_PATH", str(tmp_path / "page_index.db"))
+    monkeypatch.setattr(legal_comparison, "_load_pages", lambda document_path, mtime: PAGES)
+    # Skip __init__: the keyword search needs neither the LLM client nor the cache
+    return LegalComparison.__new__(LegalComparison), str(document)
+
+def _found(provisions):
+    return sorted((p["article"], p["page"]) for p in provisions)
+
+def test_article_crossing_page_break_keeps_page_excerpt(comparison):
+    finder, document = comparison
+    
+    found = _found(finder.find_legal_provisions([document], "inheritance"))
+    
+    assert ("Article 1", 0) in found
+    assert ("Page 2", 1) in found
+
+def test_page_index_matches_full_scan(comparison, monkeypatch):
+    finder, document = comparison
+    indexed = _found(finder.find_legal_provisions([document], "inheritance"))
+    
+    def unavailable(document_paths, terms):
+        raise RuntimeError("index disabled")
+    monkeypatch.setattr(legal_comparison, "_search_page_index", unavailable)
+    monkeypatch.setattr(legal_comparison.st, "warning", lambda message: None)
+    
+    assert _found(finder.find_legal_provisions([document], "inheritance")) == indexed
@@ -5,11 +5,23 @@ Level 4 Feature: Automated drafting of legal letters/memos with official formatt
 import os
 import streamlit as st
 import tempfile
-from datetime import datetime
+from datetime import date, datetime
 from langchain_openai import ChatOpenAI
 from utils.env_loader import load_env_vars
 from utils.pdf_generator import generate_pdf, create_custom_report
 
+# Per-template output budgets; a demand letter needs far fewer tokens than a contract
+TEMPLATE_MAX_TOKENS = {
+    "legal_memo": 1500,
+    "legal_opinion": 2200,
+    "demand_letter": 1200,
+    "contract_agreement": 2800
+}
+
+# The prompts ask the model to finish with this marker so generation stops early
+DOCUMENT_END_MARKER = "---END---"
+DOCUMENT_STOP_SEQUENCES = ["\n\nEND OF DOCUMENT", DOCUMENT_END_MARKER]
+
 class DocumentDrafter:
     """Generate legal documents, letters, and memos with official formatting."""
     
@@ -31,6 +43,9 @@ class DocumentDrafter:
             }
         )
         
+        # (date, formatted string) for the default document date
+        self._today_cache = None
+        
         # Templates for different document types
         self.templates = {
             "legal_memo": self._legal_memo_template,
@@ -39,6 +54,13 @@ class DocumentDrafter:
             "contract_agreement": self._contract_agreement_template
         }
     
+    def _today_str(self):
+        """Return today's date formatted for documents, re-formatting only when the date changes."""
+        today = date.today()
+        if self._today_cache is None or self._today_cache[0] != today:
+            self._today_cache = (today, today.strftime('%B %d, %Y'))
+        return self._today_cache[1]
+    
     def _legal_memo_template(self, params):
         """Template for generating a legal memo."""
         prompt = f"""
@@ -46,7 +68,7 @@ class DocumentDrafter:
         
         TO: {params.get('recipient', '[Recipient]')}
         FROM: {params.get('sender', '[Sender]')}
-        DATE: {params.get('date', datetime.now().strftime('%B %d, %Y'))}
+        DATE: {params.get('date', self._today_str())}
         SUBJECT: {params.get('subject', 'Legal Analysis')}
         
         ISSUE:
@@ -65,9 +87,10 @@ class DocumentDrafter:
         [Summarize your findings and provide clear recommendations for next steps.]
         
         Please draft a complete and professional legal memorandum following this structure. Use formal language appropriate for internal legal communication. Cite relevant Omani legal authorities where applicable.
+        End the document with a final line containing only {DOCUMENT_END_MARKER}
         """
         
-        return self._generate_content(prompt)
+        return self._generate_content(prompt, TEMPLATE_MAX_TOKENS["legal_memo"])
     
     def _legal_opinion_template(self, params):
         """Template for generating a legal opinion letter."""
@@ -75,7 +98,7 @@ class DocumentDrafter:
         Write a formal legal opinion letter based on the following parameters:
         
         LETTERHEAD: {params.get('firm_name', 'Legal Office')}
-        DATE: {params.get('date', datetime.now().strftime('%B %d, %Y'))}
+        DATE: {params.get('date', self._today_str())}
         
         ADDRESSEE:
         {params.get('addressee', '[Client Name and Address]')}
@@ -109,9 +132,10 @@ class DocumentDrafter:
         {params.get('firm_name', '[Firm Name]')}
         
         Please draft a complete and professional legal opinion letter following this structure. Use formal language appropriate for client communication. Cite relevant Omani legal authorities where applicable.
+        End the document with a final line containing only {DOCUMENT_END_MARKER}
         """
         
-        return self._generate_content(prompt)
+        return self._generate_content(prompt, TEMPLATE_MAX_TOKENS["legal_opinion"])
     
     def _demand_letter_template(self, params):
         """Template for generating a legal demand letter."""
@@ -119,7 +143,7 @@ class DocumentDrafter:
         Write a formal demand letter based on the following parameters:
         
         LETTERHEAD: {params.get('firm_name', 'Legal Office')}
-        DATE: {params.get('date', datetime.now().strftime('%B %d, %Y'))}
+        DATE: {params.get('date', self._today_str())}
         
         ADDRESSEE:
         {params.get('addressee', '[Recipient Name and Address]')}
@@ -153,9 +177,10 @@ class DocumentDrafter:
         {params.get('firm_name', '[Firm Name]')}
         
         Please draft a complete and professional demand letter following this structure. Use formal, authoritative language. The tone should be firm but professional. Cite relevant Omani legal authorities where applicable.
+        End the document with a final line containing only {DOCUMENT_END_MARKER}
         """
         
-        return self._generate_content(prompt)
+        return self._generate_content(prompt, TEMPLATE_MAX_TOKENS["demand_letter"])
     
     def _contract_agreement_template(self, params):
         """Template for generating a contract or agreement."""
@@ -167,7 +192,7 @@ class DocumentDrafter:
         PARTIES:
         {params.get('parties', '1. [First Party Name and Details] 2. [Second Party Name and Details]')}
         
-        DATE: {params.get('date', datetime.now().strftime('%B %d, %Y'))}
+        DATE: {params.get('date', self._today_str())}
         
         RECITALS:
         [Background information explaining why the parties are entering into this agreement]
@@ -206,14 +231,19 @@ class DocumentDrafter:
         Date: ___________________            Date: ___________________
         
         Please draft a complete and professional contract agreement following this structure. Use formal legal language appropriate for binding agreements. Ensure the agreement complies with Omani legal requirements for contracts.
+        End the document with a final line containing only {DOCUMENT_END_MARKER}
         """
         
-        return self._generate_content(prompt)
+        return self._generate_content(prompt, TEMPLATE_MAX_TOKENS["contract_agreement"])
     
-    def _generate_content(self, prompt):
+    def _generate_content(self, prompt, max_tokens=None):
         """Generate content using the LLM based on the provided prompt."""
         try:
-            response = self.llm.invoke(prompt)
+            response = self.llm.invoke(
+                prompt,
+                stop=DOCUMENT_STOP_SEQUENCES,
+                max_tokens=max_tokens or self.llm.max_tokens
+            )
             return response.content
         except Exception as e:
             st.error(f"Error generating document content: {str(e)}")
@@ -238,19 +268,21 @@ class DocumentDrafter:
         
         return template_func(parameters)
     
-    def generate_document_pdf(self, doc_type, parameters):
+    def generate_document_pdf(self, doc_type, parameters, content=None):
         """
         Generate a PDF document from a drafted legal document.
         
         Args:
             doc_type: Type of document to draft
             parameters: Dictionary of parameters for the document template
+            content: Already drafted content (optional, drafted with the LLM if omitted)
             
         Returns:
             Path to the generated PDF file
         """
-        # Generate the document content
-        content = self.draft_document(doc_type, parameters)
+        # Generate the document content if it was not supplied
+        if content is None:
+            content = self.draft_document(doc_type, parameters)
         
         if not content:
             return None
@@ -285,12 +317,12 @@ class DocumentDrafter:
                 metadata += "\n"
                 metadata += f"FROM: {parameters.get('sender', '[Sender]')}"
                 metadata += "\n"
-                metadata += f"DATE: {parameters.get('date', datetime.now().strftime('%B %d, %Y'))}"
+                metadata += f"DATE: {parameters.get('date', self._today_str())}"
                 metadata += "\n"
                 metadata += f"SUBJECT: {parameters.get('subject', 'Legal Analysis')}"
                 metadata += "\n"
             elif doc_type in ["legal_opinion", "demand_letter"]:
-                metadata += f"DATE: {parameters.get('date', datetime.now().strftime('%B %d, %Y'))}"
+                metadata += f"DATE: {parameters.get('date', self._today_str())}"
                 metadata += "\n"
                 metadata += f"ADDRESSEE: {parameters.get('addressee', '[Recipient]')}"
                 metadata += "\n"
@@ -318,6 +350,24 @@ class DocumentDrafter:
             st.error(f"Error generating PDF: {str(e)}")
             return None
     
+    def draft_and_render(self, doc_type, parameters):
+        """
+        Draft a legal document and render it to PDF with a single LLM call.
+        
+        Args:
+            doc_type: Type of document to draft
+            parameters: Dictionary of parameters for the document template
+            
+        Returns:
+            Tuple of (generated content, path to the generated PDF file)
+        """
+        content = self.draft_document(doc_type, parameters)
+        
+        if not content:
+            return None, None
+        
+        return content, self.generate_document_pdf(doc_type, parameters, content=content)
+    
     def render_document_drafter_interface(self):
         """Render the document drafter interface in Streamlit."""
         st.subheader("Legal Document Drafter")
@@ -373,8 +423,8 @@ class DocumentDrafter:
         # Generate document button
         if st.button("Generate Document"):
             with st.spinner("Drafting document... This may take a moment."):
-                # Generate the document content
-                content = self.draft_document(doc_type, parameters)
+                # Draft the content and render the PDF from the same draft
+                content, pdf_path = self.draft_and_render(doc_type, parameters)
                 
                 if content:
                     # Display the generated content
@@ -383,9 +433,7 @@ class DocumentDrafter:
                     with st.expander("Preview Document"):
                         st.markdown(content)
                     
-                    # Generate and provide PDF download
-                    pdf_path = self.generate_document_pdf(doc_type, parameters)
-                    
+                    # Provide PDF download
                     if pdf_path:
                         with open(pdf_path, "rb") as f:
                             pdf_bytes = f.read()
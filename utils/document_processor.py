@@ -2,11 +2,12 @@ import fitz  # PyMuPDF
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema.document import Document
 from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from functools import lru_cache
 import os
 
-# API keys
-OPENROUTER_API_KEY = "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"
+# Small sentence-embedding model: 384-dim vectors instead of the 1536-dim OpenAI ones
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 
 class LegalTextSplitter(RecursiveCharacterTextSplitter):
     """Custom text splitter for Omani legal documents."""
@@ -24,27 +25,29 @@ class LegalTextSplitter(RecursiveCharacterTextSplitter):
         # Add section identification logic here in the future
         return documents
 
+def extract_page_texts(file_path):
+    """
+    Extract the text of every page in a PDF.
+    Pages are read sequentially through one document handle; PyMuPDF does not support multithreaded use.
+    """
+    with fitz.open(file_path) as doc:
+        return [page.get_text("text") for page in doc]
+
 def process_law_pdf(file_path):
     """Process a legal PDF document and return langchain Document objects."""
     try:
-        doc = fitz.open(file_path)
-        text = ""
+        page_texts = extract_page_texts(file_path)
         
-        # Extract text and maintain structure
-        for page_num, page in enumerate(doc):
-            text += page.get_text()
-            text += "\n\n"  # Add extra newlines between pages
+        # Join pages in one pass, with extra newlines between pages
+        text = "".join(f"{page_text}\n\n" for page_text in page_texts)
         
         # Get document metadata
         metadata = {
             "source": os.path.basename(file_path),
             "title": os.path.basename(file_path).replace(".pdf", ""),
-            "page_count": len(doc)
+            "page_count": len(page_texts)
         }
         
-        # Close the document
-        doc.close()
-        
         # Split text into chunks
         splitter = LegalTextSplitter()
         chunks = splitter.split_text(text)
@@ -61,6 +64,15 @@ def process_law_pdf(file_path):
     except Exception as e:
         raise Exception(f"Error processing PDF: {str(e)}")
 
+@lru_cache(maxsize=1)
+def get_embeddings():
+    """Return the shared embedding model, loading it on first use."""
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+
 def setup_vector_db(documents, persist_directory="./omani_laws"):
     """Set up a vector database from document chunks."""
     try:
@@ -68,18 +80,15 @@ def setup_vector_db(documents, persist_directory="./omani_laws"):
         os.makedirs(persist_directory, exist_ok=True)
         
         # Set up embeddings
-        embeddings = OpenAIEmbeddings(openai_api_key=OPENROUTER_API_KEY)
+        embeddings = get_embeddings()
         
-        # Create vector store
+        # Create vector store (Chroma persists automatically when persist_directory is set)
         vector_db = Chroma.from_documents(
             documents=documents,
             embedding=embeddings,
             persist_directory=persist_directory
         )
         
-        # Persist to disk
-        vector_db.persist()
-        
         return vector_db
     
     except Exception as e:
@@ -4,12 +4,237 @@ Level 3 Feature: Side-by-section legal provision comparison with difference high
 """
 import os
 import re
+import sys
+import json
+import time
+import sqlite3
 import difflib
+import hashlib
+from contextlib import closing
+from functools import lru_cache
+from html import escape
 import streamlit as st
-from typing import List, Dict, Tuple, Optional
-import fitz  # PyMuPDF
+from typing import Any, Callable, Iterator, List, Dict, Tuple, Optional, Union
+import faiss
+import numpy as np
 from langchain_openai import ChatOpenAI
+from openai import APIConnectionError, InternalServerError, RateLimitError
 from utils.env_loader import load_env_vars
+from utils.document_processor import extract_page_texts, get_embeddings
+from utils.llm_cache import LLMCache, LLM_PROMPT_VERSION, file_sha256, make_key
+from utils.parallel import thread_map
+
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:  # Ranking is optional; results keep document order without it
+    process = None
+
+try:
+    from diff_match_patch import diff_match_patch
+except ImportError:  # Falls back to difflib's line-level HtmlDiff
+    diff_match_patch = None
+
+# Concurrent LLM requests when analyzing candidate pages
+AI_PAGE_WORKERS = 16
+
+# Candidate pages from one document sent in a single prompt, and retries after transient API errors
+# before falling back to per-page calls
+AI_BATCH_PAGES = 10
+AI_BATCH_RETRIES = 2
+
+# Connection, timeout, rate-limit and server errors are worth retrying; a malformed reply is not
+_TRANSIENT_LLM_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
+
+# Token budget for each provision embedded in comparison and analysis prompts
+PROMPT_PROVISION_TOKENS = 2000
+
+# Upper bound on the time spent computing one character-level diff
+DIFF_TIMEOUT_SECONDS = 1.0
+
+# Above this many combined lines, HtmlDiff's intra-line matching is too slow; emit a unified diff instead
+HTML_DIFF_MAX_LINES = 5000
+
+_DIFF_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>Legal Comparison</title></head>
+<body dir="auto">
+<h3>{fromdesc} &rarr; {todesc}</h3>
+<div>{body}</div>
+</body>
+</html>"""
+
+# Article references in both English and Arabic ("Article 5", "المادة 5"), compiled once per process.
+# Case variants are listed explicitly so the engine never case-folds page text.
+_ARTICLE_RE = re.compile(r'(Article|ARTICLE|article|المادة|مادة)\s+(\d+[a-zA-Z]*)')
+
+# Fields of the line-oriented LLM responses; single-line fields stop at the end of their line
+_RESPONSE_ARTICLE_RE = re.compile(r'ARTICLE:[ \t]*(.+)')
+_RESPONSE_SECTION_RE = re.compile(r'SECTION:[ \t]*(.+)')
+_RESPONSE_EXTRACT_RE = re.compile(r'EXTRACT:[ \t]*(.+)', re.DOTALL)
+_RESPONSE_SIMILAR_RE = re.compile(r'SIMILAR:\s*(.+?)(?=UNIQUE_TO_FIRST:)', re.DOTALL)
+_RESPONSE_UNIQUE1_RE = re.compile(r'UNIQUE_TO_FIRST:\s*(.+?)(?=UNIQUE_TO_SECOND:)', re.DOTALL)
+_RESPONSE_UNIQUE2_RE = re.compile(r'UNIQUE_TO_SECOND:\s*(.+?)(?=\Z|\n\n)', re.DOTALL)
+
+# Arabic keywords related to penalties/criminal law, matched together in a single scan
+_ARABIC_PENALTY_TERMS = ('جزاء', 'عقوبة', 'عقوبات', 'جريمة', 'جنائي', 'جناية')
+_PENALTY_RE = re.compile("|".join(_ARABIC_PENALTY_TERMS))
+
+def _text_digest(text: str) -> str:
+    """Short content hash used to de-duplicate provision texts without comparing full bodies."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+@lru_cache(maxsize=1)
+def _token_encoding():
+    """Load the tokenizer on first use; None if tiktoken or its encoding data is unavailable."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+def _truncate_tokens(text: str, max_tokens: int = PROMPT_PROVISION_TOKENS) -> str:
+    """Trim text to at most max_tokens tokens so long provisions cannot overflow the model context."""
+    # Every token covers at least one character, so short texts need no encoding
+    if len(text) <= max_tokens:
+        return text
+    
+    encoding = _token_encoding()
+    if encoding is None:
+        # Rough fallback of about four characters per token
+        return text[:max_tokens * 4]
+    
+    tokens = encoding.encode(text)
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+def _compile_terms(terms: List[str]) -> re.Pattern:
+    """Compile search terms into one case-insensitive alternation (longest first) so text is scanned once."""
+    return re.compile("|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+
+@lru_cache(maxsize=32)
+def _load_pages(document_path: str, mtime: float) -> Tuple[str, ...]:
+    """
+    Extract the text of every page in a document.
+    Cached in-process across queries and reruns (without st.cache_data's per-hit copy);
+    keyed on mtime so edited PDFs are re-read.
+    Extraction is sequential; PyMuPDF must not be used from several threads, so call this from one thread only.
+    """
+    return tuple(extract_page_texts(document_path))
+
+def _split_lines(text: str) -> List[str]:
+    """Split text into interned lines, so repeated boilerplate lines share one object and compare by identity."""
+    return [sys.intern(line) for line in text.splitlines()]
+
+def _iter_articles(pages: Tuple[str, ...]) -> Iterator[Tuple[int, str, str]]:
+    """Yield (page number, article id, article text) for every article reference in a document."""
+    for page_num, text in enumerate(pages):
+        matches = list(_ARTICLE_RE.finditer(text))
+        for i, match in enumerate(matches):
+            start_pos = match.end()
+            # End at the next article, or take a reasonable chunk of text after the last one
+            end_pos = matches[i+1].start() if i < len(matches) - 1 else min(start_pos + 1500, len(text))
+            yield page_num, f"{match.group(1)} {match.group(2)}", text[start_pos:end_pos].strip()
+
+@st.cache_resource(show_spinner=False)
+def _build_article_index(document_paths: Tuple[str, ...], mtimes: Tuple[float, ...]):
+    """
+    Embed every article once and index the vectors for inner-product search.
+    Rebuilt only when the document set or any document's mtime changes.
+    """
+    articles = []
+    for document_path, mtime in zip(document_paths, mtimes):
+        for page_num, article_id, text in _iter_articles(_load_pages(document_path, mtime)):
+            if text:
+                articles.append({
+                    "source": document_path,
+                    "document": os.path.basename(document_path),
+                    "page": page_num,
+                    "article": article_id,
+                    "section": "",
+                    "text": text,
+                    "lines": _split_lines(text),
+                    "display": f"{os.path.basename(document_path)} - {article_id} (Page {page_num+1})"
+                })
+    
+    if not articles:
+        return None, articles
+    
+    # Embeddings are normalized, so inner product is cosine similarity
+    vectors = np.asarray(get_embeddings().embed_documents([a["text"] for a in articles]), dtype="float32")
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+    return index, articles
+
+# Persistent full-text index of page texts, refreshed per document when its mtime changes
+PAGE_INDEX_PATH = "./page_index.db"
+
+def _search_page_index(document_paths: List[str], terms: List[str]) -> Dict[str, List[int]]:
+    """
+    Look up the pages containing any of the terms via the SQLite FTS5 index.
+    Returns the matching page numbers per document, in page order.
+    The trigram tokenizer keeps the case-insensitive substring semantics of the page scan,
+    so Arabic terms still match inside words carrying attached prefixes.
+    """
+    with closing(sqlite3.connect(PAGE_INDEX_PATH, timeout=30)) as conn:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5("
+                     "source UNINDEXED, page UNINDEXED, text, tokenize='trigram')")
+        conn.execute("CREATE TABLE IF NOT EXISTS indexed_documents (source TEXT PRIMARY KEY, mtime REAL)")
+        
+        for document_path in document_paths:
+            mtime = os.path.getmtime(document_path)
+            row = conn.execute("SELECT mtime FROM indexed_documents WHERE source = ?", (document_path,)).fetchone()
+            if row is not None and row[0] == mtime:
+                continue
+            
+            with conn:
+                conn.execute("DELETE FROM pages WHERE source = ?", (document_path,))
+                conn.executemany(
+                    "INSERT INTO pages VALUES (?, ?, ?)",
+                    ((document_path, page_num, text)
+                     for page_num, text in enumerate(_load_pages(document_path, mtime)) if text)
+                )
+                conn.execute("INSERT OR REPLACE INTO indexed_documents VALUES (?, ?)", (document_path, mtime))
+        
+        # Quote each term as a phrase so FTS5 query syntax in user input is matched literally
+        match_query = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        placeholders = ", ".join("?" * len(document_paths))
+        rows = conn.execute(
+            f"SELECT source, page FROM pages "
+            f"WHERE pages MATCH ? AND source IN ({placeholders}) ORDER BY source, page",
+            (match_query, *document_paths)
+        ).fetchall()
+    
+    page_nums = {}
+    for source, page in rows:
+        page_nums.setdefault(source, []).append(page)
+    return page_nums
+
+@st.cache_data(show_spinner=False)
+def _html_diff(lines1: Tuple[str, ...], lines2: Tuple[str, ...], fromdesc: str, todesc: str) -> str:
+    """Render an HTML diff; cached so re-selecting the same pair is free."""
+    if diff_match_patch is not None:
+        # Character-level diff with a timeout bounding worst-case runtime
+        dmp = diff_match_patch()
+        dmp.Diff_Timeout = DIFF_TIMEOUT_SECONDS
+        diffs = dmp.diff_main("\n".join(lines1), "\n".join(lines2))
+        dmp.diff_cleanupSemantic(diffs)
+        return _DIFF_PAGE_TEMPLATE.format(fromdesc=escape(fromdesc), todesc=escape(todesc),
+                                          body=dmp.diff_prettyHtml(diffs))
+    
+    if len(lines1) + len(lines2) > HTML_DIFF_MAX_LINES:
+        unified = "\n".join(difflib.unified_diff(lines1, lines2, fromfile=fromdesc, tofile=todesc, lineterm=""))
+        return _DIFF_PAGE_TEMPLATE.format(fromdesc=escape(fromdesc), todesc=escape(todesc),
+                                          body=f"<pre>{escape(unified)}</pre>")
+    
+    return difflib.HtmlDiff().make_file(list(lines1), list(lines2), fromdesc=fromdesc, todesc=todesc)
+
+@st.cache_data(show_spinner=False)
+def _compare_pair(_comparison: "LegalComparison", provision1: Dict, provision2: Dict) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Compare a provision pair line by line; cached across reruns for the same pair.
+    AI comparisons are not cached here, so a failed call that fell back to this diff is retried;
+    successful responses are reused from the LLM response cache.
+    """
+    return _comparison.compare_provisions(provision1, provision2)
 
 class LegalComparison:
     """Handle comparison between legal provisions with difference highlighting."""
@@ -32,167 +257,270 @@ class LegalComparison:
                 "X-Title": "ShariaAI - Omani Legal Assistant"
             }
         )
+        
+        # Responses persist across sessions, so unchanged documents and queries skip the API
+        self.llm_cache = LLMCache()
     
-    def extract_provision(self, document_path: str, query: str) -> List[Dict[str, str]]:
+    def _invoke_cached(self, prompt: str, *context: str, parse: Optional[Callable[[str], Any]] = None) -> Any:
         """
-        Extract legal provisions from a document based on a query.
+        Invoke the LLM, reusing the stored response for the same model, prompt version, prompt and context.
         
         Args:
-            document_path: Path to the PDF document
-            query: Query to find relevant provisions (e.g., "Article 5", "inheritance", "الجزاء")
+            prompt: Prompt to send
+            context: Extra key material not contained in the prompt (e.g. a document hash)
+            parse: Optional parser applied to the response; responses it rejects are not cached
             
         Returns:
-            List of dictionaries with extracted provisions, including:
-            - text: The extracted text
-            - page: Page number
-            - article: Article number if identified
-            - section: Section identifier if available
+            The response text, or the parsed response if a parser is given
         """
-        results = []
+        key = make_key(self.llm.model_name, LLM_PROMPT_VERSION, prompt, *context)
+        response = self.llm_cache.get(key)
+        if response is not None:
+            return parse(response) if parse else response
         
-        try:
-            # Open the document
-            doc = fitz.open(document_path)
-            
-            # Prepare regex patterns for finding articles and sections
-            # Enhanced to handle both English and Arabic article references
-            article_pattern = re.compile(r'(Article|المادة|مادة)\s+(\d+[a-zA-Z]*)', re.IGNORECASE | re.UNICODE)
-            
-            # Handle Arabic numerals as well
-            arabic_numerals = {'٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4', 
-                               '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9'}
-            
-            # Convert query to handle both English and Arabic
-            query_lower = query.lower()
-            
-            # Check if the query has Arabic chars to use appropriate search method
-            has_arabic = any(ord(c) > 127 for c in query)
+        response = self.llm.invoke(prompt).content
+        result = parse(response) if parse else response
+        self.llm_cache.set(key, response)
+        return result
+    
+    def _iter_provisions(self, document_path: str, query: Union[str, List[str]],
+                         page_nums: Optional[List[int]] = None) -> Iterator[Dict[str, str]]:
+        """
+        Yield legal provisions from a document one at a time, so callers can stop early.
+        
+        Args:
+            document_path: Path to the PDF document
+            query: Query string or list of terms, as for extract_provision
+            page_nums: Pages to scan, in order; all pages if None
+        """
+        # Page text comes from the per-document cache, so repeated queries skip PDF parsing
+        pages = _load_pages(document_path, os.path.getmtime(document_path))
+        
+        # Handle Arabic numerals as well
+        arabic_numerals = {'٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4', 
+                           '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9'}
+        
+        terms = [query] if isinstance(query, str) else list(query)
+        
+        # Case-insensitive matcher for all terms, built once, so pages are never lower-cased copies
+        query_re = _compile_terms(terms)
+        
+        # Check if the query has Arabic chars to use appropriate search method
+        has_arabic = any(ord(c) > 127 for term in terms for c in term)
+        
+        # Penalty-related queries also match pages mentioning any related penalty term
+        is_penalty_query = any(term.lower() in _ARABIC_PENALTY_TERMS for term in terms)
+        
+        # Process each page
+        for page_num in range(len(pages)) if page_nums is None else page_nums:
+            text = pages[page_num]
+            # Determine if this page is relevant to the query
+            page_is_relevant = False
             
-            # Additional Arabic keywords related to penalties/criminal law
-            arabic_penalty_terms = ['جزاء', 'عقوبة', 'عقوبات', 'جريمة', 'جنائي', 'جناية']
+            if has_arabic:
+                # For Arabic queries, check for exact matches and related legal terms
+                if query_re.search(text):
+                    page_is_relevant = True
+                elif is_penalty_query and _PENALTY_RE.search(text):
+                    page_is_relevant = True
+            else:
+                # For English queries
+                if query_re.search(text):
+                    page_is_relevant = True
             
-            # Process each page
-            for page_num, page in enumerate(doc):
-                text = page.get_text()
-                text_lower = text.lower()
+            if page_is_relevant:
+                page_has_hits = False
                 
-                # Determine if this page is relevant to the query
-                page_is_relevant = False
+                # Find article references
+                matches = list(_ARTICLE_RE.finditer(text))
                 
-                if has_arabic:
-                    # For Arabic queries, check for exact matches and related legal terms
-                    if query_lower in text_lower:
-                        page_is_relevant = True
-                    elif any(term in text_lower for term in arabic_penalty_terms) and \
-                         query_lower in arabic_penalty_terms:
-                        page_is_relevant = True
-                else:
-                    # For English queries
-                    if query_lower in text_lower:
-                        page_is_relevant = True
+                if matches:
+                    for i, match in enumerate(matches):
+                        article_prefix = match.group(1)  # "Article" or "المادة"
+                        article_num = match.group(2)    # Article number
+                        article_id = f"{article_prefix} {article_num}"
+                        
+                        # Extract the paragraph/section content following the article reference
+                        start_pos = match.end()
+                        
+                        # Determine end position - either next article or about 1500 chars
+                        if i < len(matches) - 1:
+                            # End at the start of the next article
+                            end_pos = matches[i+1].start()
+                        else:
+                            # If no next article, take a reasonable chunk of text
+                            end_pos = min(start_pos + 1500, len(text))
+                        
+                        section_text = text[start_pos:end_pos].strip()
+                        
+                        # Check if section contains query or related terms
+                        section_relevant = False
+                        if query_re.search(section_text):
+                            section_relevant = True
+                        elif has_arabic and _PENALTY_RE.search(section_text):
+                            section_relevant = True
+                        
+                        if section_relevant:
+                            page_has_hits = True
+                            yield {
+                                "source": document_path,
+                                "document": os.path.basename(document_path),
+                                "page": page_num,
+                                "article": article_id,
+                                "section": "",  # No specific section identifier
+                                "text": section_text,
+                                "lines": _split_lines(section_text),
+                                "display": f"{os.path.basename(document_path)} - {article_id} (Page {page_num+1})"
+                            }
                 
-                if page_is_relevant:
-                    # Find article references
-                    matches = list(article_pattern.finditer(text))
+                # If no article matches but the page contains the query, include relevant excerpt
+                if not page_has_hits:
+                    # Find the most relevant paragraph containing the query
+                    paragraphs = text.split('\n\n')
+                    relevant_paragraphs = []
                     
-                    if matches:
-                        for i, match in enumerate(matches):
-                            article_prefix = match.group(1)  # "Article" or "المادة"
-                            article_num = match.group(2)    # Article number
-                            article_id = f"{article_prefix} {article_num}"
-                            
-                            # Extract the paragraph/section content following the article reference
-                            start_pos = match.end()
-                            
-                            # Determine end position - either next article or about 1500 chars
-                            if i < len(matches) - 1:
-                                # End at the start of the next article
-                                end_pos = matches[i+1].start()
-                            else:
-                                # If no next article, take a reasonable chunk of text
-                                end_pos = min(start_pos + 1500, len(text))
-                            
-                            section_text = text[start_pos:end_pos].strip()
-                            
-                            # Check if section contains query or related terms
-                            section_relevant = False
-                            if query_lower in section_text.lower():
-                                section_relevant = True
-                            elif has_arabic and any(term in section_text.lower() for term in arabic_penalty_terms):
-                                section_relevant = True
-                            
-                            if section_relevant:
-                                results.append({
-                                    "source": document_path,
-                                    "document": os.path.basename(document_path),
-                                    "page": page_num,
-                                    "article": article_id,
-                                    "section": "",  # No specific section identifier
-                                    "text": section_text
-                                })
+                    for para in paragraphs:
+                        if query_re.search(para) or \
+                           (has_arabic and _PENALTY_RE.search(para)):
+                            relevant_paragraphs.append(para)
                     
-                    # If no article matches but the page contains the query, include relevant excerpt
-                    if not results or not any(r["page"] == page_num for r in results):
-                        # Find the most relevant paragraph containing the query
-                        paragraphs = text.split('\n\n')
-                        relevant_paragraphs = []
-                        
-                        for para in paragraphs:
-                            if query_lower in para.lower() or \
-                               (has_arabic and any(term in para.lower() for term in arabic_penalty_terms)):
-                                relevant_paragraphs.append(para)
-                        
-                        if relevant_paragraphs:
-                            # Join the relevant paragraphs with some context
-                            context = '\n\n'.join(relevant_paragraphs)
-                            results.append({
+                    if relevant_paragraphs:
+                        # Join the relevant paragraphs with some context
+                        context = '\n\n'.join(relevant_paragraphs)
+                        yield {
+                            "source": document_path,
+                            "document": os.path.basename(document_path),
+                            "page": page_num,
+                            "article": f"Page {page_num+1}",
+                            "section": "",
+                            "text": context,
+                            "lines": _split_lines(context),
+                            "display": f"{os.path.basename(document_path)} - Page {page_num+1}"
+                        }
+                    else:
+                        # If no specific paragraph is found, include part of the page
+                        # Find position of query in text
+                        query_match = query_re.search(text)
+                        if query_match:
+                            # Take text around the query position
+                            query_pos = query_match.start()
+                            start = max(0, query_pos - 300)
+                            end = min(len(text), query_pos + 700)
+                            context = text[start:end]
+                            yield {
                                 "source": document_path,
                                 "document": os.path.basename(document_path),
                                 "page": page_num,
                                 "article": f"Page {page_num+1}",
                                 "section": "",
-                                "text": context
-                            })
-                        else:
-                            # If no specific paragraph is found, include part of the page
-                            # Find position of query in text
-                            query_pos = text_lower.find(query_lower)
-                            if query_pos >= 0:
-                                # Take text around the query position
-                                start = max(0, query_pos - 300)
-                                end = min(len(text), query_pos + 700)
-                                context = text[start:end]
-                                results.append({
-                                    "source": document_path,
-                                    "document": os.path.basename(document_path),
-                                    "page": page_num,
-                                    "article": f"Page {page_num+1}",
-                                    "section": "",
-                                    "text": context
-                                })
+                                "text": context,
+                                "lines": _split_lines(context),
+                                "display": f"{os.path.basename(document_path)} - Page {page_num+1}"
+                            }
+    
+    def extract_provision(self, document_path: str, query: Union[str, List[str]],
+                          page_nums: Optional[List[int]] = None) -> List[Dict[str, str]]:
+        """
+        Extract legal provisions from a document based on a query.
+        
+        Args:
+            document_path: Path to the PDF document
+            query: Query to find relevant provisions (e.g., "Article 5", "inheritance", "الجزاء"),
+                   or a list of such terms matched together in one pass
+            page_nums: Pages to scan, e.g. candidates from the page index; all pages if None
+            
+        Returns:
+            List of dictionaries with extracted provisions, including:
+            - text: The extracted text
+            - lines: The extracted text split into interned lines
+            - display: Label shown for the provision in the interface
+            - page: Page number
+            - article: Article number if identified
+            - section: Section identifier if available
+        """
+        results = []
+        
+        try:
+            for provision in self._iter_provisions(document_path, query, page_nums):
+                results.append(provision)
         except Exception as e:
             st.error(f"Error extracting provisions from {document_path}: {str(e)}")
             
         return results
     
-    def find_legal_provisions(self, document_paths: List[str], query: str) -> List[Dict[str, str]]:
+    def find_legal_provisions(self, document_paths: List[str], query: Union[str, List[str]]) -> List[Dict[str, str]]:
         """
         Find legal provisions across multiple documents.
         
         Args:
             document_paths: List of paths to PDF documents
-            query: Query to find relevant provisions
+            query: Query to find relevant provisions, or a list of terms searched in a single pass per page
             
         Returns:
             List of dictionaries with extracted provisions
         """
+        terms = [query] if isinstance(query, str) else list(query)
+        if any(term.lower() in _ARABIC_PENALTY_TERMS for term in terms):
+            # Penalty queries also match pages mentioning related penalty terms, as in _iter_provisions
+            terms += _ARABIC_PENALTY_TERMS
+        
+        # The full-text index picks the pages the scan would find relevant, so only those are scanned;
+        # the scan still builds the results, keeping its page excerpts. The trigram tokenizer needs 3+ characters
+        candidate_pages = None
+        if document_paths and all(len(term) >= 3 for term in terms):
+            try:
+                candidate_pages = _search_page_index(document_paths, terms)
+            except Exception as e:
+                st.warning(f"Page index unavailable, scanning every page instead: {str(e)}")
+        
         all_results = []
         
+        # Documents are searched one at a time: PyMuPDF is not thread-safe, and the scan itself holds the GIL.
+        # extract_provision reports a failing document and moves on to the next one
         for doc_path in document_paths:
-            results = self.extract_provision(doc_path, query)
-            all_results.extend(results)
+            page_nums = None if candidate_pages is None else candidate_pages.get(doc_path, [])
+            all_results.extend(self.extract_provision(doc_path, query, page_nums))
         
-        return all_results
+        return self._rank_provisions(all_results, query)
+    
+    def semantic_find_legal_provisions(self, document_paths: List[str], query: str, k: int = 50) -> List[Dict[str, str]]:
+        """
+        Find legal provisions by embedding similarity rather than exact keyword matches.
+        
+        Args:
+            document_paths: List of paths to PDF documents
+            query: Natural-language or keyword query
+            k: Maximum number of provisions to return
+            
+        Returns:
+            List of dictionaries with extracted provisions, most similar first
+        """
+        try:
+            paths = tuple(sorted(document_paths))
+            index, articles = _build_article_index(paths, tuple(os.path.getmtime(path) for path in paths))
+            if index is None:
+                return []
+            
+            query_vector = np.asarray([get_embeddings().embed_query(query)], dtype="float32")
+            _, ids = index.search(query_vector, min(k, len(articles)))
+            
+            # Copy the cached entries so callers can annotate results freely
+            return [dict(articles[i]) for i in ids[0] if i != -1]
+        except Exception as e:
+            st.error(f"Error in semantic provision search: {str(e)}")
+            return []
+    
+    def _rank_provisions(self, provisions: List[Dict[str, str]], query: Union[str, List[str]]) -> List[Dict[str, str]]:
+        """Order provisions by fuzzy similarity of their article heading and opening text to the query."""
+        if process is None or len(provisions) < 2:
+            return provisions
+        
+        query_text = query if isinstance(query, str) else " ".join(query)
+        heads = [f"{p['article']} {p['text'][:200]}" for p in provisions]
+        
+        # rapidfuzz scores all heads in C, avoiding a per-pair Python loop
+        ranked = process.extract(query_text, heads, scorer=fuzz.WRatio, limit=None)
+        return [provisions[index] for _, _, index in ranked]
     
     def compare_provisions(self, provision1: Dict[str, str], provision2: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
         """
@@ -208,26 +536,42 @@ class LegalComparison:
             - unique_to_first: Lines unique to the first provision
             - unique_to_second: Lines unique to the second provision
         """
-        # Split text into lines
-        text1 = provision1["text"].split("\n")
-        text2 = provision2["text"].split("\n")
-        
-        # Use difflib to compare the text
-        differ = difflib.Differ()
-        diff = list(differ.compare(text1, text2))
+        # Lines are split once at extraction time
+        text1 = provision1["lines"]
+        text2 = provision2["lines"]
         
         # Categorize the differences
         similar_lines = []
         unique_to_first = []
         unique_to_second = []
         
-        for line in diff:
-            if line.startswith("  "):  # Common line
-                similar_lines.append(line[2:])
-            elif line.startswith("- "):  # Unique to first text
-                unique_to_first.append(line[2:])
-            elif line.startswith("+ "):  # Unique to second text
-                unique_to_second.append(line[2:])
+        if diff_match_patch is not None:
+            # Line-mode Myers diff: each distinct line is mapped to one character, diffed, then mapped back
+            dmp = diff_match_patch()
+            dmp.Diff_Timeout = DIFF_TIMEOUT_SECONDS
+            chars1, chars2, line_array = dmp.diff_linesToChars(
+                "".join(f"{line}\n" for line in text1), "".join(f"{line}\n" for line in text2)
+            )
+            diffs = dmp.diff_main(chars1, chars2, False)
+            dmp.diff_charsToLines(diffs, line_array)
+            
+            buckets = {0: similar_lines, -1: unique_to_first, 1: unique_to_second}
+            for op, segment in diffs:
+                buckets[op].extend(segment.splitlines())
+            
+            return similar_lines, unique_to_first, unique_to_second
+        
+        # Otherwise use difflib's matcher directly; Differ's intra-line "?" hints are never used here
+        matcher = difflib.SequenceMatcher(None, text1, text2, autojunk=True)
+        
+        # Matching blocks cover the equal spans; the gaps between them are the changed lines.
+        # The final block is a zero-length sentinel at the end of both texts, so trailing gaps are included.
+        prev1 = prev2 = 0
+        for i, j, size in matcher.get_matching_blocks():
+            unique_to_first.extend(text1[prev1:i])  # Unique to first text
+            unique_to_second.extend(text2[prev2:j])  # Unique to second text
+            similar_lines.extend(text1[i:i + size])  # Common lines
+            prev1, prev2 = i + size, j + size
         
         return similar_lines, unique_to_first, unique_to_second
     
@@ -242,15 +586,14 @@ class LegalComparison:
         Returns:
             HTML string with highlighted differences
         """
-        # Split text into lines
-        text1 = provision1["text"].split("\n")
-        text2 = provision2["text"].split("\n")
+        # Lines are split once at extraction time
+        text1 = provision1["lines"]
+        text2 = provision2["lines"]
         
-        # Generate HTML diff
-        diff = difflib.HtmlDiff()
-        html = diff.make_file(text1, text2, 
-                             fromdesc=f"{provision1['document']} - {provision1['article']}", 
-                             todesc=f"{provision2['document']} - {provision2['article']}")
+        # Generate HTML diff (memoized on the line tuples and labels)
+        html = _html_diff(tuple(text1), tuple(text2),
+                          fromdesc=f"{provision1['document']} - {provision1['article']}",
+                          todesc=f"{provision2['document']} - {provision2['article']}")
         
         return html
     
@@ -265,10 +608,15 @@ class LegalComparison:
         Returns:
             Highlighted text as a string
         """
-        text = provision["text"]
-        for line in unique_lines:
-            text = text.replace(line, f"**{line}**")
-        return text
+        # AI comparison returns fragments rather than whole lines, so match substrings.
+        # One alternation (longest first, so shorter fragments never shadow longer ones)
+        # scans the text once instead of a replace() per unique line.
+        fragments = sorted({line for line in unique_lines if line.strip()}, key=len, reverse=True)
+        if not fragments:
+            return provision["text"]
+        
+        pattern = re.compile("|".join(map(re.escape, fragments)))
+        return pattern.sub(lambda match: f"**{match.group(0)}**", provision["text"])
     
     def ai_find_legal_provisions(self, document_paths: List[str], query: str) -> List[Dict[str, str]]:
         """
@@ -281,99 +629,213 @@ class LegalComparison:
         Returns:
             List of dictionaries with extracted provisions
         """
-        all_results = []
+        # Basic results using traditional search, gathered in the same per-document pass
+        basic_results = []
         
-        # Basic results using traditional search
-        basic_results = self.find_legal_provisions(document_paths, query)
+        # One case-insensitive pattern screens pages for any query keyword in a single pass
+        keywords = query.split()
+        keyword_re = _compile_terms(keywords)
         
-        # If we found results with basic search, use them as a starting point
-        if basic_results:
-            all_results.extend(basic_results)
-        
-        # For each document, extract more potential matches using AI
+        # Screen every document's pages first, so the LLM calls can all run concurrently
+        candidates = []
         for doc_path in document_paths:
             try:
-                # Open the document and read its metadata
-                doc = fitz.open(doc_path)
                 doc_name = os.path.basename(doc_path)
                 
+                # Cached AI responses are keyed on the document contents, not just its path
+                pdf_hash = file_sha256(doc_path)
+                
+                # Page text comes from the same cache the keyword search uses
+                pages = _load_pages(doc_path, os.path.getmtime(doc_path))
+                basic_results.extend(self._iter_provisions(doc_path, query))
+                
                 # For each page, analyze content with AI if it might contain relevant information
-                for page_num, page in enumerate(doc):
-                    text = page.get_text()
-                    
+                for page_num, text in enumerate(pages):
                     # Skip pages that are clearly not relevant
                     if len(text.strip()) < 50:  # Skip nearly empty pages
                         continue
                         
                     # Check if this page might be relevant with a simple heuristic
-                    # before using the more expensive AI call
-                    keywords = query.lower().split()
-                    text_lower = text.lower()
-                    
-                    # Skip if no keywords match at all
-                    if not any(keyword in text_lower for keyword in keywords):
+                    # before using the more expensive AI call; skip if no keywords match at all
+                    if not keywords or not keyword_re.search(text):
                         continue
                     
-                    # Now use AI to extract relevant provisions
-                    prompt = f"""
-                    You are an expert legal assistant specializing in Omani law. 
-                    I'm looking for legal provisions related to: "{query}"
-                    
-                    Analyze the following page content and determine if it contains relevant legal provisions. 
-                    If it does, identify the specific article numbers and section titles.
-                    
-                    PAGE CONTENT:
-                    {text[:1500]}  # Limit to 1500 chars to avoid token limits
-                    
-                    Is this content relevant to the query? If yes, extract the article numbers and text.
-                    Respond in this JSON-like format:
-                    RELEVANT: Yes/No
-                    ARTICLE: Article number or identifier (if found)
-                    SECTION: Section title or identifier (if found)
-                    EXTRACT: The exact text of the relevant provision
-                    """
-                    
-                    try:
-                        # Use AI to analyze the page content
-                        response = self.llm.invoke(prompt).content
-                        
-                        # Parse the response to extract the information
-                        if "RELEVANT: Yes" in response:
-                            # Extract article info
-                            article_match = re.search(r'ARTICLE: (.+)', response)
-                            article = article_match.group(1) if article_match else f"Unnamed Provision {page_num+1}"
-                            
-                            # Extract section info
-                            section_match = re.search(r'SECTION: (.+)', response)
-                            section = section_match.group(1) if section_match else ""
-                            
-                            # Extract text
-                            extract_match = re.search(r'EXTRACT: (.+)', response, re.DOTALL)
-                            extract = extract_match.group(1).strip() if extract_match else text
-                            
-                            # Append results only if not duplicated
-                            provision = {
-                                "source": doc_path,
-                                "document": doc_name,
-                                "page": page_num,
-                                "article": article,
-                                "section": section,
-                                "text": extract
-                            }
-                            
-                            # Check if this provision is already included
-                            if not any(r["text"] == extract for r in all_results):
-                                all_results.append(provision)
-                                
-                    except Exception as e:
-                        st.error(f"Error in AI analysis: {str(e)}")
-                        continue
+                    candidates.append((doc_path, doc_name, pdf_hash, page_num, text))
                     
             except Exception as e:
                 st.error(f"Error processing document {doc_path}: {str(e)}")
         
+        # If we found results with basic search, use them as a starting point
+        all_results = self._rank_provisions(basic_results, query)
+        
+        # Hashes of the texts already collected, for O(1) duplicate checks
+        seen_hashes = {_text_digest(r["text"]) for r in all_results}
+        
+        # Group each document's candidate pages into batches, one LLM call per batch
+        batches = []
+        for candidate in candidates:
+            if batches and batches[-1][0][0] == candidate[0] and len(batches[-1]) < AI_BATCH_PAGES:
+                batches[-1].append(candidate)
+            else:
+                batches.append([candidate])
+        
+        # LLM calls are I/O-bound HTTP requests; results come back in page order, so merging stays deterministic
+        for batch_results in thread_map(lambda batch: self._ai_analyze_batch(query, batch),
+                                        batches, max_workers=AI_PAGE_WORKERS):
+            for provision in batch_results:
+                if not provision:
+                    continue
+                
+                # Check if this provision is already included
+                text_hash = _text_digest(provision["text"])
+                if text_hash not in seen_hashes:
+                    seen_hashes.add(text_hash)
+                    all_results.append(provision)
+        
         return all_results
     
+    def _ai_analyze_batch(self, query: str, batch: List[Tuple[str, str, str, int, str]]) -> List[Optional[Dict[str, str]]]:
+        """
+        Ask the LLM which of several pages of one document are relevant, in a single structured prompt.
+        The reply carries no extracts, so it fits the model's output budget; relevant pages are returned whole.
+        Transient API errors are retried with exponential backoff; any other failure falls back
+        to one call per page straight away.
+        
+        Args:
+            query: Query to find relevant provisions
+            batch: (doc_path, doc_name, pdf_hash, page_num, text) tuples from the same document
+            
+        Returns:
+            Provision dictionaries for the relevant pages
+        """
+        if len(batch) == 1:
+            return [self._ai_analyze_page(query, *batch[0])]
+        
+        pages_block = "\n\n".join(f"### PAGE {page_num + 1}\n{text[:1500]}" for *_, page_num, text in batch)
+        prompt = f"""
+        You are an expert legal assistant specializing in Omani law. 
+        I'm looking for legal provisions related to: "{query}"
+        
+        Analyze each of the following pages and determine whether it contains relevant legal provisions. 
+        If it does, identify the specific article numbers and section titles.
+        
+        {pages_block}
+        
+        Respond with only a JSON object of this form, with one entry per page above and no quoted page text:
+        {{"pages": [{{"page": <page number>, "relevant": true/false, "article": "<article number or identifier>", "section": "<section title or identifier>"}}]}}
+        """
+        
+        pdf_hash = batch[0][2]
+        for attempt in range(AI_BATCH_RETRIES + 1):
+            try:
+                return self._invoke_cached(prompt, pdf_hash,
+                                           parse=lambda response: self._parse_batch_response(response, batch))
+            except _TRANSIENT_LLM_ERRORS as e:
+                error = e
+                if attempt < AI_BATCH_RETRIES:
+                    time.sleep(2 ** attempt)
+            except Exception as e:
+                # A malformed or cut-off reply would come back unchanged at temperature 0, so don't retry it
+                error = e
+                break
+        
+        st.warning(f"Batched AI analysis failed, analyzing pages individually: {str(error)}")
+        return [self._ai_analyze_page(query, *candidate) for candidate in batch]
+    
+    def _parse_batch_response(self, response: str, batch: List[Tuple[str, str, str, int, str]]) -> List[Dict[str, str]]:
+        """Turn a batched JSON response into provisions; raises if it does not match the expected schema."""
+        # Models sometimes wrap the JSON in prose or code fences
+        start, end = response.find("{"), response.rfind("}")
+        if start == -1 or end < start:
+            raise ValueError("No JSON object in response")
+        
+        entries = json.loads(response[start:end + 1])["pages"]
+        if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+            raise ValueError("Unexpected JSON structure in response")
+        by_page = {int(entry["page"]): entry for entry in entries}
+        
+        provisions = []
+        for doc_path, doc_name, _, page_num, text in batch:
+            entry = by_page.get(page_num + 1)
+            if not entry or not entry.get("relevant"):
+                continue
+            
+            extract = text.strip()
+            article = str(entry.get("article") or f"Unnamed Provision {page_num+1}")
+            provisions.append({
+                "source": doc_path,
+                "document": doc_name,
+                "page": page_num,
+                "article": article,
+                "section": str(entry.get("section") or ""),
+                "text": extract,
+                "lines": _split_lines(extract),
+                "display": f"{doc_name} - {article} (Page {page_num+1})"
+            })
+        
+        return provisions
+    
+    def _ai_analyze_page(self, query: str, doc_path: str, doc_name: str, pdf_hash: str,
+                         page_num: int, text: str) -> Optional[Dict[str, str]]:
+        """
+        Ask the LLM whether a page holds a provision relevant to the query.
+        
+        Returns:
+            Provision dictionary if the page is relevant, otherwise None
+        """
+        # Now use AI to extract relevant provisions
+        prompt = f"""
+        You are an expert legal assistant specializing in Omani law. 
+        I'm looking for legal provisions related to: "{query}"
+        
+        Analyze the following page content and determine if it contains relevant legal provisions. 
+        If it does, identify the specific article numbers and section titles.
+        
+        PAGE CONTENT:
+        {text[:1500]}  # Limit to 1500 chars to avoid token limits
+        
+        Is this content relevant to the query? If yes, extract the article numbers and text.
+        Respond in this JSON-like format:
+        RELEVANT: Yes/No
+        ARTICLE: Article number or identifier (if found)
+        SECTION: Section title or identifier (if found)
+        EXTRACT: The exact text of the relevant provision
+        """
+        
+        try:
+            # Use AI to analyze the page content
+            response = self._invoke_cached(prompt, pdf_hash)
+            
+            # Parse the response to extract the information
+            if "RELEVANT: Yes" not in response:
+                return None
+            
+            # Extract article info
+            article_match = _RESPONSE_ARTICLE_RE.search(response)
+            article = article_match.group(1) if article_match else f"Unnamed Provision {page_num+1}"
+            
+            # Extract section info
+            section_match = _RESPONSE_SECTION_RE.search(response)
+            section = section_match.group(1) if section_match else ""
+            
+            # Extract text
+            extract_match = _RESPONSE_EXTRACT_RE.search(response)
+            extract = extract_match.group(1).strip() if extract_match else text
+            
+            return {
+                "source": doc_path,
+                "document": doc_name,
+                "page": page_num,
+                "article": article,
+                "section": section,
+                "text": extract,
+                "lines": _split_lines(extract),
+                "display": f"{doc_name} - {article} (Page {page_num+1})"
+            }
+        except Exception as e:
+            st.error(f"Error in AI analysis: {str(e)}")
+            return None
+    
     def ai_compare_provisions(self, provision1: Dict[str, str], provision2: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
         """
         Compare two legal provisions using AI for better understanding and highlighting differences.
@@ -388,6 +850,10 @@ class LegalComparison:
             - unique_to_first: Lines unique to the first provision
             - unique_to_second: Lines unique to the second provision
         """
+        # Identical provisions need neither a diff nor an API call
+        if provision1["text"] == provision2["text"]:
+            return list(provision1["lines"]), [], []
+        
         # First use the basic comparison to get initial diff lines
         similar, unique1, unique2 = self.compare_provisions(provision1, provision2)
         
@@ -398,10 +864,10 @@ class LegalComparison:
         focusing on legal implications rather than just textual differences.
         
         PROVISION 1 ({provision1.get('article', 'Section')}):
-        {provision1['text']}
+        {_truncate_tokens(provision1['text'])}
         
         PROVISION 2 ({provision2.get('article', 'Section')}):
-        {provision2['text']}
+        {_truncate_tokens(provision2['text'])}
         
         Please identify semantically meaningful differences and similarities, considering the legal context.
         When highlighting differences, don't just focus on wording but on legal impact and meaning.
@@ -414,12 +880,12 @@ class LegalComparison:
         
         try:
             # Use AI to analyze the legal differences
-            response = self.llm.invoke(prompt).content
+            response = self._invoke_cached(prompt)
             
             # Parse the response to extract enhanced differentiators
-            similar_section = re.search(r'SIMILAR:\s*(.+?)(?=UNIQUE_TO_FIRST:)', response, re.DOTALL)
-            unique1_section = re.search(r'UNIQUE_TO_FIRST:\s*(.+?)(?=UNIQUE_TO_SECOND:)', response, re.DOTALL)
-            unique2_section = re.search(r'UNIQUE_TO_SECOND:\s*(.+?)(?=\Z|\n\n)', response, re.DOTALL)
+            similar_section = _RESPONSE_SIMILAR_RE.search(response)
+            unique1_section = _RESPONSE_UNIQUE1_RE.search(response)
+            unique2_section = _RESPONSE_UNIQUE2_RE.search(response)
             
             # Extract the text if found
             similar_ai = similar_section.group(1).strip().split('\n') if similar_section else []
@@ -455,10 +921,10 @@ class LegalComparison:
         discussing the legal implications and practical effects of the differences.
         
         PROVISION 1 ({provision1.get('article', 'Section')}) from {os.path.basename(provision1['source'])}:
-        {provision1['text']}
+        {_truncate_tokens(provision1['text'])}
         
         PROVISION 2 ({provision2.get('article', 'Section')}) from {os.path.basename(provision2['source'])}:
-        {provision2['text']}
+        {_truncate_tokens(provision2['text'])}
         
         Your analysis should cover:
         1. The key substantive differences between the provisions
@@ -472,7 +938,7 @@ class LegalComparison:
         
         try:
             # Generate the legal analysis
-            analysis = self.llm.invoke(prompt).content
+            analysis = self._invoke_cached(prompt)
             return analysis
         except Exception as e:
             return f"Error generating legal analysis: {str(e)}"
@@ -493,6 +959,10 @@ class LegalComparison:
         use_ai_search = st.checkbox("Use AI for finding provisions", value=True,
                                   help="Enable to use AI for better matching, especially for Arabic text")
                                   
+        # Embedding-based search, used when AI search is off
+        use_semantic_search = st.checkbox("Use semantic search", value=False,
+                                        help="Match provisions by meaning rather than exact keywords")
+        
         # Add AI-assisted comparison option
         use_ai_comparison = st.checkbox("Use AI for comparison analysis", value=True,
                                      help="Enable to get AI-powered legal analysis of differences")
@@ -501,6 +971,8 @@ class LegalComparison:
             # Find legal provisions
             if use_ai_search:
                 provisions = self.ai_find_legal_provisions(document_paths, query)
+            elif use_semantic_search:
+                provisions = self.semantic_find_legal_provisions(document_paths, query)
             else:
                 provisions = self.find_legal_provisions(document_paths, query)
             
@@ -513,10 +985,8 @@ class LegalComparison:
                     selected_provisions = []
                     
                     for i, provision in enumerate(provisions):
-                        doc_name = os.path.basename(provision["source"])
-                        label = f"{doc_name} - {provision.get('article', 'Section')} (Page {provision['page']+1})"
-                        
-                        if st.checkbox(label, key=f"provision_{i}"):
+                        # Labels are built once when provisions are extracted
+                        if st.checkbox(provision["display"], key=f"provision_{i}"):
                             selected_provisions.append(provision)
                     
                     # Compare selected provisions
@@ -527,45 +997,45 @@ class LegalComparison:
                         prov1 = selected_provisions[0]
                         prov2 = selected_provisions[1]
                         
-                        # Choose comparison method based on user preference
+                        # Choose comparison method based on user preference; the line diff is cached per pair,
+                        # and repeated AI comparisons are answered from the LLM response cache
                         if use_ai_comparison:
                             similar, unique1, unique2 = self.ai_compare_provisions(prov1, prov2)
                         else:
-                            similar, unique1, unique2 = self.compare_provisions(prov1, prov2)
+                            similar, unique1, unique2 = _compare_pair(self, prov1, prov2)
                         
                         col1, col2 = st.columns(2)
                         
                         with col1:
-                            doc_name1 = os.path.basename(prov1["source"])
-                            st.write(f"**{doc_name1} - {prov1.get('article', 'Section')}**")
+                            st.write(f"**{prov1['document']} - {prov1['article']}**")
                             st.markdown(self.get_highlighted_text(prov1, unique1), unsafe_allow_html=True)
                         
                         with col2:
-                            doc_name2 = os.path.basename(prov2["source"])
-                            st.write(f"**{doc_name2} - {prov2.get('article', 'Section')}**")
+                            st.write(f"**{prov2['document']} - {prov2['article']}**")
                             st.markdown(self.get_highlighted_text(prov2, unique2), unsafe_allow_html=True)
                         
-                        # Generate and display HTML diff
-                        html_diff = self.generate_html_diff(provision1, provision2)
-                        
-                        # Create a download button for the HTML diff
-                        st.download_button(
-                            label="Download Detailed Comparison",
-                            data=html_diff,
-                            file_name="legal_comparison.html",
-                            mime="text/html"
-                        )
+                        # The HTML diff is only built on request; generate_html_diff memoizes it per pair
+                        if st.checkbox("Prepare detailed comparison for download", key="prepare_html_diff"):
+                            html_diff = self.generate_html_diff(prov1, prov2)
+                            
+                            # Create a download button for the HTML diff
+                            st.download_button(
+                                label="Download Detailed Comparison",
+                                data=html_diff,
+                                file_name="legal_comparison.html",
+                                mime="text/html"
+                            )
                         
                         # Show summary of differences
                         st.subheader("Summary of Differences")
                         
                         if unique1:
-                            st.write(f"**Unique to {provision1['document']} - {provision1['article']}:**")
+                            st.write(f"**Unique to {prov1['document']} - {prov1['article']}:**")
                             for line in unique1:
                                 st.write(f"- {line}")
                         
                         if unique2:
-                            st.write(f"**Unique to {provision2['document']} - {provision2['article']}:**")
+                            st.write(f"**Unique to {prov2['document']} - {prov2['article']}:**")
                             for line in unique2:
                                 st.write(f"- {line}")
                         
@@ -0,0 +1,133 @@
+"""
+On-disk cache of LLM responses for ShariaAI.
+Responses are stored as JSON files keyed by a SHA-256 digest of everything that determines them.
+"""
+import os
+import json
+import hashlib
+import tempfile
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Optional
+
+# Bump when prompt wording changes so responses to the old prompts are not reused
+LLM_PROMPT_VERSION = "v1"
+
+# Recent responses kept in memory in front of the disk cache
+MEMORY_CACHE_ENTRIES = 256
+
+# Bounds on the disk cache, enforced when a cache is opened: entries past the age limit go first, then the oldest beyond the count limit
+DISK_CACHE_MAX_ENTRIES = 10000
+DISK_CACHE_MAX_AGE_DAYS = 30
+
+def make_key(*parts: str) -> str:
+    """Hash length-prefixed parts, so different part lists can never produce the same key."""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+@lru_cache(maxsize=64)
+def _file_sha256(path: str, mtime: float) -> str:
+    """Hash a file's contents in chunks; cached until the file's mtime changes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def file_sha256(path: str) -> str:
+    """Return the SHA-256 of a file's contents."""
+    return _file_sha256(path, os.path.getmtime(path))
+
+class LLMCache:
+    """JSON-file cache of LLM responses, one file per key, with a small in-memory LRU in front."""
+
+    def __init__(self, cache_dir: str = "./llm_cache", memory_entries: int = MEMORY_CACHE_ENTRIES,
+                 max_entries: int = DISK_CACHE_MAX_ENTRIES, max_age_days: float = DISK_CACHE_MAX_AGE_DAYS):
+        """Initialize the cache, creating its directory if needed and pruning it to its bounds."""
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self._prune()
+
+        # Streamlit reruns repeat the same prompts; serve those without touching the disk
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key: str, value: str):
+        """Record a response in the in-memory LRU, evicting the oldest entry when full."""
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            if len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _prune(self):
+        """Delete entries (and leftover temp files) older than max_age_days, then the oldest beyond max_entries."""
+        cutoff = time.time() - self.max_age_days * 86400
+        entries = []
+        for bucket in os.scandir(self.cache_dir):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                try:
+                    mtime = entry.stat().st_mtime
+                except OSError:
+                    continue
+                if mtime < cutoff:
+                    self._remove(entry.path)
+                elif entry.name.endswith(".json"):
+                    entries.append((mtime, entry.path))
+
+        if len(entries) > self.max_entries:
+            entries.sort()
+            for _, path in entries[:len(entries) - self.max_entries]:
+                self._remove(path)
+
+    @staticmethod
+    def _remove(path: str):
+        """Delete a cache file, ignoring one already removed by another session."""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _path(self, key: str) -> str:
+        """Fan entries out by key prefix to keep directories small."""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for a key, or None on a miss or unreadable entry."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                value = json.load(f)["response"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+        self._remember(key, value)
+        return value
+
+    def set(self, key: str, value: str):
+        """Store a response; written to a temp file and renamed so readers never see partial entries."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        entry = {"response": value, "created_at": datetime.now(timezone.utc).isoformat()}
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(path),
+                                         suffix=".tmp", delete=False) as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(f.name, path)
+        self._remember(key, value)
@@ -0,0 +1,28 @@
+"""
+Thread pool helpers for ShariaAI.
+Worker threads are attached to the calling Streamlit script run, so st.* calls made inside them still render.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+def streamlit_thread_pool(max_workers: int) -> ThreadPoolExecutor:
+    """Create a thread pool whose workers share the caller's Streamlit script context."""
+    ctx = get_script_run_ctx()
+    return ThreadPoolExecutor(
+        max_workers=max_workers,
+        initializer=lambda: add_script_run_ctx(ctx=ctx)
+    )
+
+def thread_map(func: Callable, items: Iterable, max_workers: int = 8) -> List:
+    """
+    Apply func to every item on a thread pool and return the results in input order.
+    Runs inline when there is at most one item, avoiding the pool start-up cost.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    
+    with streamlit_thread_pool(min(max_workers, len(items))) as executor:
+        return list(executor.map(func, items))
@@ -1,11 +1,25 @@
 from langchain.chains import RetrievalQA
 from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
-import os
+from functools import lru_cache
+import httpx
+from utils.env_loader import load_env_vars
 
-# API keys
-OPENROUTER_API_KEY = "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"
-LLAMAINDEX_API_KEY = "llx-gtcRZJSsolYe3nOrX80tXf5cMySyp2K4KdCd14HbWcTor3jz"
+# API keys come from the environment / .env rather than the source
+env_vars = load_env_vars()
+OPENROUTER_API_KEY = env_vars["openrouter_api_key"]
+
+def _create_http_client():
+    """Create the HTTP client shared by every chat model, using HTTP/2 when the h2 package is available."""
+    limits = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+    timeout = httpx.Timeout(120.0, connect=10.0)  # Long answers can take a while to generate
+    try:
+        return httpx.Client(http2=True, limits=limits, timeout=timeout)
+    except ImportError:
+        return httpx.Client(limits=limits, timeout=timeout)
+
+# One connection pool for all OpenRouter requests made from this module
+_HTTP_CLIENT = _create_http_client()
 
 # Define prompt templates
 qa_template = """You are ShariaAI, an AI-powered legal assistant specializing in Omani law.
@@ -24,36 +38,35 @@ qa_prompt = PromptTemplate(
     input_variables=["question", "context"]
 )
 
+@lru_cache(maxsize=4)
+def _get_llm(model, temperature=0, max_tokens=2000):
+    """Return a shared OpenRouter chat client, so rebuilt chains reuse its connection pool."""
+    if not OPENROUTER_API_KEY:
+        raise Exception("OPENROUTER_API_KEY is not set. Add it to the environment or a .env file.")
+    
+    # Configure OpenRouter with proper base URL and headers
+    return ChatOpenAI(
+        openai_api_key=OPENROUTER_API_KEY,
+        model=model,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        base_url="https://openrouter.ai/api/v1",
+        http_client=_HTTP_CLIENT,
+        default_headers={
+            "HTTP-Referer": "https://github.com/alanqoudif/ankaa-project",
+            "X-Title": "ShariaAI - Omani Legal Assistant"
+        }
+    )
+
 def create_qa_chain(vector_db, use_openrouter=True):
     """Create a RetrievalQA chain with the given vector database."""
     try:
         # Set up the language model
         if use_openrouter:
-            # Configure OpenRouter with proper base URL and headers
-            llm = ChatOpenAI(
-                openai_api_key=OPENROUTER_API_KEY,
-                model="openai/gpt-4o",
-                temperature=0,
-                max_tokens=2000,
-                base_url="https://openrouter.ai/api/v1",
-                default_headers={
-                    "HTTP-Referer": "https://github.com/alanqoudif/ankaa-project",
-                    "X-Title": "ShariaAI - Omani Legal Assistant"
-                }
-            )
+            llm = _get_llm("openai/gpt-4o")
         else:
             # Fallback to local model in future implementation
-            llm = ChatOpenAI(
-                openai_api_key=OPENROUTER_API_KEY,
-                model="openai/gpt-3.5-turbo",
-                temperature=0,
-                max_tokens=2000,
-                base_url="https://openrouter.ai/api/v1",
-                default_headers={
-                    "HTTP-Referer": "https://github.com/alanqoudif/ankaa-project",
-                    "X-Title": "ShariaAI - Omani Legal Assistant"
-                }
-            )
+            llm = _get_llm("openai/gpt-3.5-turbo")
         
         # Create the retrieval QA chain
         qa_chain = RetrievalQA.from_chain_type(
@@ -86,6 +99,10 @@ def analyze_legal_case(qa_chain, scenario, focus_areas):
     except Exception as e:
         raise Exception(f"Error analyzing case: {str(e)}")
 
+def _chain_llm(qa_chain):
+    """Return the chat model behind a RetrievalQA chain."""
+    return qa_chain.combine_documents_chain.llm_chain.llm
+
 def compare_legal_provisions(qa_chain, provision1, provision2):
     """Compare two legal provisions and highlight differences."""
     try:
@@ -101,7 +118,8 @@ def compare_legal_provisions(qa_chain, provision1, provision2):
         
         Format your response clearly with headings for each section."""
         
-        result = qa_chain.run(comparison_prompt)
+        # Both provisions are already in the prompt, so skip the retriever and call the model directly
+        result = _chain_llm(qa_chain).invoke(comparison_prompt).content
         return result
     
     except Exception as e:
@@ -2,234 +2,426 @@
 Section Navigator for ShariaAI Omani Legal Assistant.
 This module enables hierarchical browsing and navigation of legal documents with Arabic support.
 """
+import os
 import re
+import pickle
+import multiprocessing
+import hashlib
+import tempfile
 import fitz  # PyMuPDF
 import streamlit as st
 import logging
+from statistics import median
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from dataclasses import dataclass
 from typing import Dict, List, Tuple, Optional
 
+# Section and subsection heading patterns fused into one alternation, so each page is scanned once.
+# Headings are found in document order; match.lastgroup names the alternative that matched.
+# Updated patterns to support both English and Arabic legal document structures
+_HEADING_RE = re.compile("|".join((
+    # Traditional English patterns (case-insensitive)
+    r'(?P<en_section>^(?i:(?P<en_type>Article|Section|Chapter))\s+(?P<en_num>\d+[a-zA-Z]*)[:.\s]*(?P<en_title>[^\n]*))',
+    
+    # Arabic patterns for sections (المادة = Article, الفصل = Chapter, etc.)
+    r'(?P<ar_section>^(?P<ar_type>المادة|الفصل|القسم|مادة|فصل)\s*(?P<ar_num>\d+[٠-٩]*)[:.\s-]*(?P<ar_title>[^\n]*))',
+    
+    # Simple numbered article pattern (common in Arabic legal docs)
+    r'(?P<num_section>^(?P<num_marker>\(\s*\d+\s*\)|\d+\s*[\.-])\s*(?P<num_content>[^\n]*))',
+    
+    # Traditional numbered subsections (1., 2., etc.)
+    r'(?P<num_sub>^(?P<num_sub_marker>\d+[a-zA-Z٠-٩]*)[\.\s-]+(?P<num_sub_content>[^\n]*))',
+    
+    # Arabic numbered and lettered subsections ((١), (أ), (ب), etc.)
+    r'(?P<ar_sub>^(?P<ar_sub_marker>\(\s*[\u0621-\u064A\u0660-\u0669]\s*\))\s*(?P<ar_sub_content>[^\n]*))'
+)), re.MULTILINE)
+
+# In the fallback detection, lines set this much larger than the page's median font size are headings
+HEADING_FONT_RATIO = 1.2
+
+# Parsing stops once a document has this many top-level sections; the remaining pages go to one appendix section
+MAX_SECTIONS_PER_DOC = 5000
+
+# Parsed documents are pickled here, so unchanged files are not re-parsed after a restart
+SECTION_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "shariaai")
+
+# Bump when parsing changes so trees built by the old parser are not reused
+SECTION_PARSER_VERSION = "v4"
+
 class LegalSection:
     """Represents a section of a legal document with hierarchical structure."""
+    # Large documents produce thousands of sections; slots avoid a per-instance __dict__
+    __slots__ = ("title", "_content_parts", "level", "parent", "children", "child_titles",
+                 "_child_by_title", "_full_path", "source_doc", "page_num")
+    
     def __init__(self, title: str, content: str, level: int, parent=None):
         self.title = title
-        self.content = content
+        # Page texts are collected as parts and joined on read, avoiding quadratic string growth
+        self._content_parts = [content] if content else []
         self.level = level
         self.parent = parent
         self.children = []
+        self.child_titles = []  # Titles of children, in order, for listing without touching each child
+        self._child_by_title = {}  # First child with each title, for path lookups
+        self._full_path = None  # Memoized by get_full_path; reset when the section is reparented
         self.source_doc = ""
         self.page_num = 0
     
+    @property
+    def content(self) -> str:
+        """The section text, with appended parts separated by newlines."""
+        return "\n".join(self._content_parts)
+    
+    @content.setter
+    def content(self, value: str):
+        self._content_parts = [value] if value else []
+    
+    def append_content(self, text: str):
+        """Append text to this section's content on a new line."""
+        self._content_parts.append(text)
+    
     def add_child(self, child):
         """Add a child section to this section."""
         child.parent = self
+        child._full_path = None
         self.children.append(child)
+        self.child_titles.append(child.title)
+        self._child_by_title.setdefault(child.title, child)
     
     def get_full_path(self):
         """Get the full path of this section."""
-        if self.parent is None:
-            return self.title
-        return f"{self.parent.get_full_path()} > {self.title}"
+        if self._full_path is None:
+            if self.parent is None:
+                self._full_path = self.title
+            else:
+                self._full_path = f"{self.parent.get_full_path()} > {self.title}"
+        return self._full_path
     
     def __str__(self):
         return f"{self.title} (Level {self.level}, {len(self.children)} children)"
 
-class SectionNavigator:
-    """Navigator for hierarchical browsing of legal documents with Arabic support."""
+@dataclass
+class LoadResult:
+    """Outcome of parsing one document; the caller decides how to present it."""
+    ok: bool
+    doc_name: str
+    n_sections: int = 0
+    message: str = ""
+    sections_found: bool = False
+    used_fallback: bool = False
+    root: Optional[LegalSection] = None
+
+def render_load_result(result: LoadResult):
+    """Show a document loading outcome in Streamlit."""
+    if not result.ok:
+        st.error(result.message)
+        return
     
-    def __init__(self):
-        self.documents = {}  # Map of doc_name to root section
-        self.current_doc = None
-        self.current_section = None
+    if result.used_fallback:
+        st.warning(f"No standard sections found in document: {result.doc_name}. Trying alternate section detection...")
     
-    def load_document(self, file_path: str) -> bool:
-        """
-        Load a document and extract its hierarchical structure with Arabic support.
-        Returns True if successful, False otherwise.
-        """
-        try:
-            doc_name = file_path.split("/")[-1]
-            doc = fitz.open(file_path)
-            
-            # Create root section for the document
-            root = LegalSection(doc_name, "", 0)
-            root.source_doc = doc_name
+    if result.sections_found:
+        st.success(result.message)
+    else:
+        st.warning(result.message)
+
+def _parse_pdf(file_path: str, max_sections: int = MAX_SECTIONS_PER_DOC,
+               max_pages: Optional[int] = None) -> LoadResult:
+    """
+    Parse a PDF into a section tree.
+    Makes no Streamlit calls, so it can run in a worker process; the tree pickles with its parent links.
+    Failures are returned as an unsuccessful LoadResult rather than raised.
+    """
+    doc_name = os.path.basename(file_path)
+    try:
+        cache_path = _cache_path(file_path, max_sections, max_pages)
+        result = _load_cached_result(cache_path)
+        if result is None:
+            result = _build_section_tree(file_path, doc_name, max_sections, max_pages)
+            _save_cached_result(cache_path, result)
+        return result
+    except Exception as e:
+        logging.error(f"Section navigator error: {str(e)}", exc_info=True)
+        return LoadResult(False, doc_name, message=f"Error loading document for section navigation: {str(e)}")
+
+def _cache_path(file_path: str, max_sections: int, max_pages: Optional[int]) -> str:
+    """Cache file for a document, keyed by its path, modification time, size and the parse limits."""
+    stat = os.stat(file_path)
+    key = f"{SECTION_PARSER_VERSION}:{os.path.abspath(file_path)}:{stat.st_mtime_ns}:{stat.st_size}:{max_sections}:{max_pages}"
+    return os.path.join(SECTION_CACHE_DIR, f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.pkl")
+
+def _load_cached_result(cache_path: str) -> Optional[LoadResult]:
+    """Return a previously parsed document, or None on a miss or unreadable entry."""
+    try:
+        with open(cache_path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, AttributeError, pickle.UnpicklingError):
+        return None
+
+def _save_cached_result(cache_path: str, result: LoadResult):
+    """Store a parsed document; written to a temp file and renamed so readers never see partial entries."""
+    if not result.ok:
+        return
+    
+    try:
+        os.makedirs(SECTION_CACHE_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile("wb", dir=SECTION_CACHE_DIR, suffix=".tmp", delete=False) as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f.name, cache_path)
+    except OSError as e:
+        # Caching is best-effort; the parsed document is still returned
+        logging.warning(f"Could not cache parsed document: {str(e)}")
+
+def _build_section_tree(file_path: str, doc_name: str, max_sections: int = MAX_SECTIONS_PER_DOC,
+                        max_pages: Optional[int] = None) -> LoadResult:
+    """
+    Extract the hierarchical structure of a document with Arabic support.
+    Only the first max_pages pages are scanned, and scanning stops after max_sections top-level sections.
+    """
+    # Extract each page's text once; both the primary and the fallback pass reuse it.
+    # sort=False keeps MuPDF's native order, as the regexes don't need reading-order sorting
+    with fitz.open(file_path) as doc:
+        page_texts = [page.get_text("text", sort=False) for page in doc]
+        # PDF bookmarks, when present, give the section structure without scanning the text
+        toc = doc.get_toc(simple=True)
+    
+    # Create root section for the document
+    root = LegalSection(doc_name, "", 0)
+    root.source_doc = doc_name
+    
+    current_section = None
+    current_subsection = None
+    sections_found = False
+    
+    # Pages from indexed_pages on are not scanned for headings
+    indexed_pages = len(page_texts) if max_pages is None else min(max_pages, len(page_texts))
+    
+    if toc:
+        indexed_pages = _add_toc_sections(root, toc, page_texts, indexed_pages, max_sections)
+        if root.children:
+            return _finish_tree(root, page_texts, indexed_pages, True, False)
+    
+    for page_num in range(indexed_pages):
+        if len(root.children) >= max_sections:
+            indexed_pages = page_num
+            break
+        
+        text = page_texts[page_num]
+        # Single pass over the page: sections and subsections in document order
+        for match in _HEADING_RE.finditer(text):
+            kind = match.lastgroup
             
-            # Extract text and identify sections
-            # Updated patterns to support both English and Arabic legal document structures
-            section_patterns = [
-                # Traditional English patterns
-                re.compile(r'^(Article|Section|Chapter)\s+(\d+[a-zA-Z]*)[:.\s]*(.*?)$', re.MULTILINE | re.IGNORECASE),
-                
-                # Arabic patterns for sections (المادة = Article, الفصل = Chapter, etc.)
-                re.compile(r'^(المادة|الفصل|القسم|مادة|فصل)\s*(\d+[٠-٩]*)[:.\s-]*(.*?)$', re.MULTILINE),
+            if kind.endswith("_section"):
+                sections_found = True
+                if kind == "num_section":
+                    # For simpler patterns with just a marker and content
+                    section_marker = match.group("num_marker")
+                    section_content = (match.group("num_content") or "").strip()
+                    title = f"{section_marker} {section_content[:50]}..."
+                else:
+                    # For patterns with type, number, and title
+                    section_type = match.group(f"{kind[:2]}_type")
+                    section_num = match.group(f"{kind[:2]}_num")
+                    section_title = (match.group(f"{kind[:2]}_title") or "").strip()
+                    
+                    # Create title based on matched groups
+                    if section_title:
+                        title = f"{section_type} {section_num}: {section_title}"
+                    else:
+                        title = f"{section_type} {section_num}"
                 
-                # Simple numbered article pattern (common in Arabic legal docs)
-                re.compile(r'^(\(\s*\d+\s*\)|\d+\s*[\.-])\s*(.*?)$', re.MULTILINE)
-            ]
-            
-            # Subsection patterns
-            subsection_patterns = [
-                # Traditional numbered subsections (1., 2., etc.)
-                re.compile(r'^(\d+[a-zA-Z٠-٩]*)[\.\s-]+(.*?)$', re.MULTILINE),
+                # Create new section
+                new_section = LegalSection(title, "", 1, root)
+                new_section.source_doc = doc_name
+                new_section.page_num = page_num
                 
-                # Arabic numbered subsections
-                re.compile(r'^(\(\s*[أ-ي١٢٣٤٥٦٧٨٩٠]\s*\))\s*(.*?)$', re.MULTILINE),
+                # Add to root
+                root.add_child(new_section)
                 
-                # Lettered subsections ((أ), (ب), etc.)
-                re.compile(r'^(\(\s*[أ-ي]\s*\))\s*(.*?)$', re.MULTILINE)
-            ]
+                # Update current section
+                current_section = new_section
+                current_subsection = None
             
-            current_section = None
-            current_subsection = None
-            sections_found = False
-            
-            for page_num, page in enumerate(doc):
-                text = page.get_text()
+            # Subsections attach to the most recent section
+            elif current_section:
+                subsection_num = match.group(f"{kind}_marker")
+                subsection_content = match.group(f"{kind}_content").strip()
                 
-                # First pass: Try to find major sections
-                for pattern in section_patterns:
-                    section_matches = pattern.finditer(text)
-                    for match in section_matches:
-                        sections_found = True
-                        if len(match.groups()) >= 2:
-                            # For patterns with type, number, and title
-                            if len(match.groups()) >= 3:
-                                section_type = match.group(1)
-                                section_num = match.group(2)
-                                section_title = match.group(3).strip() if match.group(3) else ""
-                                
-                                # Create title based on matched groups
-                                if section_title:
-                                    title = f"{section_type} {section_num}: {section_title}"
-                                else:
-                                    title = f"{section_type} {section_num}"
-                            else:
-                                # For simpler patterns with just a marker and content
-                                section_marker = match.group(1)
-                                section_content = match.group(2).strip() if len(match.groups()) > 1 else ""
-                                title = f"{section_marker} {section_content[:50]}..."
-                            
-                            # Create new section
-                            new_section = LegalSection(title, "", 1, root)
-                            new_section.source_doc = doc_name
-                            new_section.page_num = page_num
-                            
-                            # Add to root
-                            root.add_child(new_section)
-                            
-                            # Update current section
-                            current_section = new_section
-                            current_subsection = None
+                # Create new subsection - limit title length for display
+                max_title_length = 50
+                truncated_content = subsection_content[:max_title_length] + ("..." if len(subsection_content) > max_title_length else "")
+                title = f"{subsection_num} {truncated_content}"
+                new_subsection = LegalSection(title, subsection_content, 2, current_section)
+                new_subsection.source_doc = doc_name
+                new_subsection.page_num = page_num
                 
-                # Find all subsection matches if we have a current section
-                if current_section:
-                    for pattern in subsection_patterns:
-                        subsection_matches = pattern.finditer(text)
-                        for match in subsection_matches:
-                            if len(match.groups()) >= 2:
-                                subsection_num = match.group(1)
-                                subsection_content = match.group(2).strip()
-                                
-                                # Create new subsection - limit title length for display
-                                max_title_length = 50
-                                truncated_content = subsection_content[:max_title_length] + ("..." if len(subsection_content) > max_title_length else "")
-                                title = f"{subsection_num} {truncated_content}"
-                                new_subsection = LegalSection(title, subsection_content, 2, current_section)
-                                new_subsection.source_doc = doc_name
-                                new_subsection.page_num = page_num
-                                
-                                # Add to current section
-                                current_section.add_child(new_subsection)
-                                
-                                # Update current subsection
-                                current_subsection = new_subsection
+                # Add to current section
+                current_section.add_child(new_subsection)
                 
-                # If we couldn't find any sections or subsections, add the page content
-                # to the current section or subsection
-                if current_subsection:
-                    current_subsection.content += f"\n{text}"
-                elif current_section:
-                    current_section.content += f"\n{text}"
-                else:
-                    # If no sections found, add the content to the root
-                    root.content += f"\n{text}"
-            
-            # If no sections were found, try a more aggressive approach to find structure
-            if not sections_found:
-                st.warning(f"No standard sections found in document: {doc_name}. Trying alternate section detection...")
+                # Update current subsection
+                current_subsection = new_subsection
+        
+        # If we couldn't find any sections or subsections, add the page content
+        # to the current section or subsection
+        if current_subsection:
+            current_subsection.append_content(text)
+        elif current_section:
+            current_section.append_content(text)
+        else:
+            # If no sections found, add the content to the root
+            root.append_content(text)
+    
+    # If no sections were found, try a more aggressive approach to find structure
+    used_fallback = not sections_found
+    if used_fallback:
+        # Headings are usually set larger than body text, so use the page layout's font sizes
+        # instead of broad regexes (which backtrack badly on paragraph text)
+        with fitz.open(file_path) as doc:
+            for page_num in range(indexed_pages):
+                if len(root.children) >= max_sections:
+                    indexed_pages = page_num
+                    break
                 
-                # Reprocess with more general patterns
-                fallback_patterns = [
-                    # Match any line that starts with a number followed by a period
-                    re.compile(r'^(\d+)[\.:\s-](.*?)$', re.MULTILINE),
-                    
-                    # Match any capitalized line or line with bold formatting (possible section heading)
-                    re.compile(r'^([A-Z][A-Z\s]+|[أ-ي][أ-ي\s]+)[:\.\s-]*(.*?)$', re.MULTILINE)
-                ]
+                layout = doc.load_page(page_num).get_text("dict")
+                lines = [line for block in layout["blocks"] if block.get("type") == 0
+                         for line in block["lines"] if line["spans"]]
+                sizes = [span["size"] for line in lines for span in line["spans"]]
+                page_sections_found = False
                 
-                # Process each page with fallback patterns
-                for page_num, page in enumerate(doc):
-                    text = page.get_text()
-                    page_sections_found = False
-                    
-                    for pattern in fallback_patterns:
-                        matches = pattern.finditer(text)
-                        for match in matches:
-                            page_sections_found = True
-                            if len(match.groups()) >= 1:
-                                marker = match.group(1)
-                                title_text = match.group(2).strip() if len(match.groups()) > 1 else ""
-                                
-                                # Create a section with whatever we found
-                                title = f"{marker}: {title_text[:50]}..." if title_text else f"{marker}"
-                                new_section = LegalSection(title, "", 1, root)
-                                new_section.source_doc = doc_name
-                                new_section.page_num = page_num
-                                
-                                # Add to root
-                                root.add_child(new_section)
-                    
-                    # If still no sections, create a page-based section
-                    if not page_sections_found and not sections_found:
-                        # Create a section for this page
-                        page_title = f"Page {page_num+1}"
-                        page_section = LegalSection(page_title, text, 1, root)
-                        page_section.source_doc = doc_name
-                        page_section.page_num = page_num
+                if sizes:
+                    threshold = median(sizes) * HEADING_FONT_RATIO
+                    for line in lines:
+                        if line["spans"][0]["size"] <= threshold:
+                            continue
+                        
+                        heading = "".join(span["text"] for span in line["spans"]).strip()
+                        if not heading:
+                            continue
+                        page_sections_found = True
+                        
+                        # Create a section for the heading, limiting title length for display
+                        title = f"{heading[:50]}..." if len(heading) > 50 else heading
+                        new_section = LegalSection(title, "", 1, root)
+                        new_section.source_doc = doc_name
+                        new_section.page_num = page_num
                         
                         # Add to root
-                        root.add_child(page_section)
-                        sections_found = True
-            
+                        root.add_child(new_section)
+                
+                # If still no sections, create a page-based section
+                if not page_sections_found and not sections_found:
+                    # Create a section for this page
+                    page_title = f"Page {page_num+1}"
+                    page_section = LegalSection(page_title, page_texts[page_num], 1, root)
+                    page_section.source_doc = doc_name
+                    page_section.page_num = page_num
+                    
+                    # Add to root
+                    root.add_child(page_section)
+                    sections_found = True
+    
+    return _finish_tree(root, page_texts, indexed_pages, sections_found, used_fallback)
+
+def _add_toc_sections(root: LegalSection, toc: List[list], page_texts: List[str],
+                      indexed_pages: int, max_sections: int) -> int:
+    """
+    Build the section tree from the PDF's bookmarks, nesting entries by their outline level.
+    Each entry's content runs from its page up to the page where the next entry starts.
+    Returns the number of pages covered, which is less than indexed_pages if max_sections was reached.
+    """
+    # Bookmarks without a target page, or pointing past the indexed pages, are skipped
+    entries = [(level, title.strip(), page - 1) for level, title, page in toc if 0 < page <= indexed_pages]
+    if entries:
+        # Front matter before the first bookmark stays with the document itself
+        for text in page_texts[:entries[0][2]]:
+            root.append_content(text)
+    
+    parents = [root]  # parents[i] is the most recent section at level i
+    for i, (level, title, page_num) in enumerate(entries):
+        if level == 1 and len(root.children) >= max_sections:
+            return page_num
+        
+        # Outline levels may skip (1 -> 3); attach to the deepest open ancestor
+        level = min(level, len(parents))
+        del parents[level:]
+        
+        next_page = entries[i + 1][2] if i + 1 < len(entries) else indexed_pages
+        section = LegalSection(title or f"Page {page_num+1}", "", level)
+        section.source_doc = root.source_doc
+        section.page_num = page_num
+        for text in page_texts[page_num:max(next_page, page_num + 1)]:
+            section.append_content(text)
+        
+        parents[-1].add_child(section)
+        parents.append(section)
+    
+    return indexed_pages
+
+def _finish_tree(root: LegalSection, page_texts: List[str], indexed_pages: int,
+                 sections_found: bool, used_fallback: bool) -> LoadResult:
+    """Add the appendix for unscanned pages and summarize the parsed document."""
+    doc_name = root.source_doc
+    
+    # Keep the unscanned tail readable as a single section
+    if indexed_pages < len(page_texts):
+        appendix = LegalSection("Appendix (not indexed)", "", 1, root)
+        appendix.source_doc = doc_name
+        appendix.page_num = indexed_pages
+        for text in page_texts[indexed_pages:]:
+            appendix.append_content(text)
+        root.add_child(appendix)
+    
+    # Report success or partial success
+    if sections_found:
+        message = f"Loaded document: {doc_name} with {len(root.children)} sections"
+        if indexed_pages < len(page_texts):
+            message += f" (first {indexed_pages} of {len(page_texts)} pages indexed)"
+    else:
+        message = f"Document loaded but no sections identified: {doc_name}"
+    
+    # Still successful without sections, as we did create a basic structure
+    return LoadResult(True, doc_name, len(root.children), message, sections_found, used_fallback, root)
+
+class SectionNavigator:
+    """Navigator for hierarchical browsing of legal documents with Arabic support."""
+    
+    def __init__(self, max_sections: int = MAX_SECTIONS_PER_DOC, max_pages: Optional[int] = None):
+        self.documents = {}  # Map of doc_name to root section
+        self.max_sections = max_sections
+        self.max_pages = max_pages
+        self.current_doc = None
+        self.current_section = None
+    
+    def load_document(self, file_path: str) -> bool:
+        """
+        Load a document and extract its hierarchical structure with Arabic support.
+        Returns True if successful, False otherwise.
+        """
+        return self._store_result(_parse_pdf(file_path, self.max_sections, self.max_pages))
+    
+    def _store_result(self, result: LoadResult) -> bool:
+        """Store a parsed document and report the outcome."""
+        if result.ok:
             # Store the document
-            self.documents[doc_name] = root
-            
-            # Clean up
-            doc.close()
-            
-            # Report success or partial success
-            if sections_found:
-                st.success(f"Loaded document: {doc_name} with {len(root.children)} sections")
-                return True
-            else:
-                st.warning(f"Document loaded but no sections identified: {doc_name}")
-                return True  # Still return True as we did create a basic structure
+            self.documents[result.doc_name] = result.root
         
-        except Exception as e:
-            st.error(f"Error loading document for section navigation: {str(e)}")
-            logging.error(f"Section navigator error: {str(e)}", exc_info=True)
-            return False
+        render_load_result(result)
+        return result.ok
     
     def load_documents(self, file_paths: List[str]) -> int:
         """
         Load multiple documents and extract their hierarchical structure.
+        Documents are parsed in parallel worker processes; results are stored in input order.
         Returns the number of successfully loaded documents.
         """
-        success_count = 0
-        for file_path in file_paths:
-            if self.load_document(file_path):
-                success_count += 1
-        return success_count
+        if len(file_paths) <= 1:
+            return sum(1 for file_path in file_paths if self.load_document(file_path))
+        
+        # Spawned, not forked: forking the Streamlit server process would copy its threads' held locks into the workers
+        with ProcessPoolExecutor(max_workers=min(len(file_paths), os.cpu_count() or 1),
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            return sum(1 for result in executor.map(_parse_pdf, file_paths, repeat(self.max_sections), repeat(self.max_pages)) if self._store_result(result))
     
     def get_documents(self) -> List[str]:
         """Get a list of document names."""
@@ -249,6 +441,12 @@ class SectionNavigator:
             return self.documents[doc_name].children
         return []
     
+    def get_section_titles(self, doc_name: str) -> List[str]:
+        """Get the titles of the top-level sections in a document."""
+        if doc_name in self.documents:
+            return self.documents[doc_name].child_titles
+        return []
+    
     def select_section(self, section_path: str) -> Optional[LegalSection]:
         """
         Select a section by its path string (e.g., "Root > Chapter 1 > Article 5").
@@ -266,14 +464,8 @@ class SectionNavigator:
         
         # Navigate down the path
         for i in range(1, len(parts)):
-            found = False
-            for child in section.children:
-                if child.title == parts[i]:
-                    section = child
-                    found = True
-                    break
-            
-            if not found:
+            section = section._child_by_title.get(parts[i])
+            if section is None:
                 return None
         
         self.current_section = section
@@ -299,15 +491,15 @@ class SectionNavigator:
             
             if sections:
                 # Format section titles for display
-                section_titles = [section.title for section in sections]
+                section_titles = self.get_section_titles(selected_doc)
                 
                 # Section selector
                 st.subheader("Section Navigation")
                 selected_section_title = st.selectbox("Select a section", section_titles)
                 
                 if selected_section_title:
-                    # Find the selected section
-                    selected_section = next((s for s in sections if s.title == selected_section_title), None)
+                    # Find the selected section (the first one with that title, as select_section does)
+                    selected_section = self.documents[selected_doc]._child_by_title.get(selected_section_title)
                     
                     if selected_section:
                         # Display section content
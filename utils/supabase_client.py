@@ -6,12 +6,17 @@ import os
 SUPABASE_URL = "https://your-supabase-project.supabase.co"
 SUPABASE_KEY = "your-supabase-key"
 
+# Created on first use and shared by every call, so its HTTP connections are reused
+_supabase = None
+
 def init_supabase():
     """Initialize Supabase client."""
+    global _supabase
     try:
         # Create Supabase client
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        return supabase
+        if _supabase is None:
+            _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+        return _supabase
     
     except Exception as e:
         raise Exception(f"Error initializing Supabase client: {str(e)}")
@@ -2,8 +2,13 @@
 Translation service for ShariaAI that uses the same AI model for translations across the application.
 This ensures consistency between the chat interface and other parts of the application.
 """
+import re
+import time
+import hashlib
+import threading
 import streamlit as st
-from typing import Optional
+from collections import OrderedDict
+from typing import List, Optional
 from utils.env_loader import load_env_vars
 import logging
 import openai
@@ -13,6 +18,64 @@ from openai import OpenAI
 env_vars = load_env_vars()
 OPENROUTER_API_KEY = env_vars.get('openrouter_api_key')
 
+# Characters in the basic Arabic block, used to detect the source language
+_ARABIC_RE = re.compile(r'[\u0600-\u06FF]')
+
+# Characters counted per step when deciding whether a text is mostly Arabic
+ARABIC_SCAN_CHUNK = 4096
+
+def _is_majority_arabic(text: str) -> bool:
+    """Return True if more than half of the text is Arabic; stops scanning once the outcome is fixed."""
+    half = len(text) / 2
+    arabic_chars = 0
+    for start in range(0, len(text), ARABIC_SCAN_CHUNK):
+        end = start + ARABIC_SCAN_CHUNK
+        arabic_chars += len(_ARABIC_RE.findall(text, start, end))
+        if arabic_chars > half:
+            return True
+        # Even if everything after this chunk were Arabic, the count could not pass half
+        if arabic_chars + max(len(text) - end, 0) <= half:
+            return False
+    return False
+
+# Translations kept in memory, so reruns don't send the same text to the model again
+TRANSLATION_CACHE_ENTRIES = 256
+
+# Line separating texts sent together in one batched translation request
+BATCH_SEPARATOR = "<<<SEGMENT>>>"
+
+# Upper bound on the reply length of a batched request
+BATCH_MAX_TOKENS = 4096
+
+# Extra attempts for a failed translation request, with exponential backoff between them
+TRANSLATION_RETRIES = 2
+
+_SYSTEM_PROMPT = "You are a professional legal translator specializing in Omani legal documents."
+
+# Prompt prefixes for the two translation directions the app uses; the text is appended
+_PROMPT_EN_AR = (
+    "Translate the following English text to Arabic. Ensure the translation is accurate, "
+    "natural-sounding Arabic with correct legal terminology:\n\n"
+)
+_PROMPT_AR_EN = (
+    "Translate the following Arabic text to English. Ensure the translation is accurate, "
+    "natural-sounding English with correct legal terminology:\n\n"
+)
+
+# Fixed translations of common structural terms, returned without calling the model
+_STATIC_GLOSSARY = {
+    ("Article", "Arabic"): "المادة",
+    ("Section", "Arabic"): "القسم",
+    ("Chapter", "Arabic"): "الفصل",
+    ("Page", "Arabic"): "صفحة",
+    ("المادة", "English"): "Article",
+    ("مادة", "English"): "Article",
+    ("القسم", "English"): "Section",
+    ("الفصل", "English"): "Chapter",
+    ("فصل", "English"): "Chapter",
+    ("صفحة", "English"): "Page",
+}
+
 class TranslationService:
     """Provides AI-powered translation services throughout the application."""
     
@@ -21,6 +84,10 @@ class TranslationService:
         self.client = None
         self.model = "qwen/qwen1.5-110b"  # Using the same model as the chat interface
         
+        # LRU of translations keyed by (text digest, source, target); digests keep long texts out of the keys
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        
         # Initialize the client using the OpenRouter API
         self._initialize_client()
     
@@ -43,6 +110,50 @@ class TranslationService:
             st.error(f"Error initializing translation service: {str(e)}")
             logging.error(f"Translation service initialization error: {str(e)}", exc_info=True)
     
+    def _cache_key(self, text: str, source_language: str, target_language: str) -> tuple:
+        """Key a translation by a digest of the text and the language pair."""
+        return (hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest(), source_language, target_language)
+    
+    def _remember(self, key: tuple, translated_text: str):
+        """Record a translation, evicting the oldest entry when the cache is full."""
+        with self._cache_lock:
+            self._cache[key] = translated_text
+            self._cache.move_to_end(key)
+            if len(self._cache) > TRANSLATION_CACHE_ENTRIES:
+                self._cache.popitem(last=False)
+    
+    def _lookup(self, key: tuple) -> Optional[str]:
+        """Return a cached translation, or None if it hasn't been translated yet."""
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        return None
+    
+    @staticmethod
+    def _build_messages(prompt: str) -> List[dict]:
+        """Chat messages for a translation prompt."""
+        return [
+            {"role": "system", "content": _SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _call_api(self, messages: List[dict], max_tokens: int) -> str:
+        """Send a translation request, retrying failures with backoff; returns the reply text."""
+        for attempt in range(TRANSLATION_RETRIES + 1):
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.2,  # Keep temperature low for consistent translations
+                    max_tokens=max_tokens
+                )
+                return response.choices[0].message.content or ""
+            except Exception:
+                if attempt == TRANSLATION_RETRIES:
+                    raise
+                time.sleep(2 ** attempt)
+    
     def translate(self, text: str, target_language: str = "Arabic", source_language: Optional[str] = None) -> str:
         """
         Translate text to the target language using AI.
@@ -57,6 +168,10 @@ class TranslationService:
         """
         if not text or not text.strip():
             return text
+        
+        glossary_term = _STATIC_GLOSSARY.get((text.strip(), target_language))
+        if glossary_term is not None:
+            return glossary_term
             
         if not self.client:
             st.warning("Translation service not available. Using original text.")
@@ -66,8 +181,7 @@ class TranslationService:
             # Determine direction for better prompt
             if source_language is None:
                 # Try to detect if it's primarily Arabic or English
-                arabic_chars = sum(1 for c in text if '\u0600' <= c <= '\u06FF')
-                if arabic_chars > len(text) / 2:
+                if _is_majority_arabic(text):
                     source_language = "Arabic"
                 else:
                     source_language = "English"
@@ -76,36 +190,25 @@ class TranslationService:
             if source_language == target_language:
                 return text
             
+            key = self._cache_key(text, source_language, target_language)
+            cached = self._lookup(key)
+            if cached is not None:
+                return cached
+            
             # Create appropriate prompt based on languages
             if target_language == "Arabic" and source_language == "English":
-                prompt = (
-                    f"Translate the following English text to Arabic. Ensure the translation is accurate, "
-                    f"natural-sounding Arabic with correct legal terminology:\n\n{text}"
-                )
+                prompt = _PROMPT_EN_AR + text
             elif target_language == "English" and source_language == "Arabic":
-                prompt = (
-                    f"Translate the following Arabic text to English. Ensure the translation is accurate, "
-                    f"natural-sounding English with correct legal terminology:\n\n{text}"
-                )
+                prompt = _PROMPT_AR_EN + text
             else:
                 prompt = f"Translate this text from {source_language} to {target_language}: {text}"
             
             # Call the API for translation
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a professional legal translator specializing in Omani legal documents."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.2,  # Keep temperature low for consistent translations
-                max_tokens=1024
-            )
-            
-            # Extract the translated text
-            translated_text = response.choices[0].message.content
+            translated_text = self._call_api(self._build_messages(prompt), 1024)
             
             # If successful, return the translation
             if translated_text and translated_text.strip():
+                self._remember(key, translated_text.strip())
                 return translated_text.strip()
             else:
                 # Fallback to original if empty response
@@ -117,6 +220,75 @@ class TranslationService:
             # Return original text on error
             return text
     
+    def translate_batch(self, texts: List[str], target_language: str = "Arabic", source_language: Optional[str] = None) -> List[str]:
+        """
+        Translate several texts, sending all uncached ones in a single API call per source language.
+        Texts whose batch reply can't be split back apart are translated one at a time.
+        
+        Returns:
+            Translations in the order of texts; a text is returned unchanged where translation fails
+        """
+        results = list(texts)
+        if not self.client:
+            st.warning("Translation service not available. Using original text.")
+            return results
+        
+        pending = {}  # Source language -> indexes of texts still to translate
+        for i, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+            
+            glossary_term = _STATIC_GLOSSARY.get((text.strip(), target_language))
+            if glossary_term is not None:
+                results[i] = glossary_term
+                continue
+            
+            source = source_language or ("Arabic" if _is_majority_arabic(text) else "English")
+            if source == target_language:
+                continue
+            
+            cached = self._lookup(self._cache_key(text, source, target_language))
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.setdefault(source, []).append(i)
+        
+        for source, indexes in pending.items():
+            translations = None
+            if len(indexes) > 1:
+                translations = self._translate_segments([texts[i] for i in indexes], source, target_language)
+            if translations is None:
+                translations = [self.translate(texts[i], target_language, source) for i in indexes]
+            
+            for i, translated in zip(indexes, translations):
+                results[i] = translated
+        
+        return results
+    
+    def _translate_segments(self, texts: List[str], source_language: str, target_language: str) -> Optional[List[str]]:
+        """Translate texts in one request; returns None if the reply doesn't split into one part per text."""
+        joined = f"\n{BATCH_SEPARATOR}\n".join(texts)
+        prompt = (
+            f"Translate each of the following {source_language} segments to {target_language}. Ensure the translations are "
+            f"accurate, natural-sounding {target_language} with correct legal terminology. The segments are separated by lines "
+            f"containing only {BATCH_SEPARATOR}; keep those separator lines exactly as they are and output nothing else:\n\n{joined}"
+        )
+        
+        try:
+            reply = self._call_api(self._build_messages(prompt), min(1024 * len(texts), BATCH_MAX_TOKENS))
+            parts = reply.split(BATCH_SEPARATOR)
+        except Exception as e:
+            logging.error(f"Batch translation error: {str(e)}", exc_info=True)
+            return None
+        
+        if len(parts) != len(texts) or not all(part.strip() for part in parts):
+            return None
+        
+        translations = [part.strip() for part in parts]
+        for text, translated in zip(texts, translations):
+            self._remember(self._cache_key(text, source_language, target_language), translated)
+        return translations
+    
     def translate_to_arabic(self, text: str) -> str:
         """Convenience method to translate text to Arabic."""
         return self.translate(text, target_language="Arabic", source_language="English")